@@ -7,32 +7,93 @@ This is a text adventure game where you explore a cave system,
 collect treasures, and avoid dangers.
 """
 
-__version__ = "0.1.0-alpha"
+from version import __version__
+
+# Where the terminal game keeps SAVE/RESTORE data
+SAVE_FILE = "adventure.sav"
 
-import random
 import sys
+from array import array
+import routing
+import savegame
 from game_data import *
 from utils import *
 
 
+# Shared read-only starting tables; each game copies them into compact arrays
+BASE_OBJECT_PLACE = array('h', [initial_placements.get(obj, 0)
+                                for obj in range(MAX_OBJECT + 1)])
+BASE_OBJECT_PROPS = bytes(MAX_OBJECT + 1)
+BASE_LOCATION_ABBREV = bytes(LOCATION_SLOTS)
+
+
+def index_objects(object_place):
+    """Build the location -> objects index for a table of object places.
+    
+    Returns (atloc, link): atloc[place] is the first object at a place and
+    link[obj] the next object at the same place, in object order, with 0
+    ending the list. atloc has one extra last slot, reachable as
+    atloc[-1], that lists the carried objects.
+    """
+    atloc = array('b', bytes(LOCATION_SLOTS + 1))
+    link = array('b', bytes(len(object_place)))
+    for obj in range(len(object_place) - 1, 0, -1):
+        place = object_place[obj]
+        link[obj] = atloc[place]
+        atloc[place] = obj
+    return atloc, link
+
+
+BASE_ATLOC, BASE_LINK = index_objects(BASE_OBJECT_PLACE)
+
+# Inverted vocabulary, and the rendered LIST exits per location (filled on demand)
+MOTION_WORDS, OBJECT_WORDS = index_vocabulary(vocabulary)
+EXIT_LISTINGS = {}
+
+# Rendered description blocks, filled on demand; the text tables never change
+# after import. Keyed by location * 2 + (1 for the long description) and by
+# object << 8 | prop; an object that isn't described renders as "".
+LOCATION_TEXT = {}
+OBJECT_TEXT = {}
+
+
 class Adventure:
-    def __init__(self):
-        """Initialize game state"""
-        # Object locations (-1 = carried, 0 = nowhere, positive = location)
-        self.object_place = initial_placements.copy()
+    __slots__ = (
+        'object_place', 'object_props', 'location_abbrev', 'atloc', 'link',
+        'location', 'old_location', 'lamp_on',
+        'dwarf_stage', 'dwarf_locations', 'old_dwarf_locations', 'dwarf_seen',
+        'first_time', 'west_count', 'detail_count', 'grate_locked',
+        'game_over', 'trouble_count', 'pending_question', 'output', 'rng',
+        'save_file',
+    )
+    
+    # Fixed objects (cannot be picked up); never changes, so shared by all games
+    fixed = fixed_objects
+    
+    # Per-turn instrumentation shared by all games (a metrics.TurnMetrics),
+    # or None when disabled
+    metrics = None
+    
+    def __init__(self, output=None, seed=None, save_file=None):
+        """Initialize game state
+        
+        output is an OutputBuffer for the turn text; seed fixes the game's
+        random stream (a fresh one is drawn if None); save_file is where the
+        SAVE and RESTORE commands keep the game (disabled if None).
+        """
+        # Object locations indexed by object number
+        # (-1 = carried, 0 = nowhere, positive = location)
+        self.object_place = array('h', BASE_OBJECT_PLACE)
         
-        # Object properties/states
-        self.object_props = {}
-        for obj in self.object_place.keys():
-            self.object_props[obj] = 0
+        # Reverse index of object_place, see index_objects()
+        self.atloc = array('b', BASE_ATLOC)
+        self.link = array('b', BASE_LINK)
         
-        # Fixed objects (cannot be picked up)
-        self.fixed = fixed_objects.copy()
+        # Object properties/states indexed by object number
+        self.object_props = bytearray(BASE_OBJECT_PROPS)
         
-        # Location visit counts for abbreviation
-        self.location_abbrev = {}
-        for i in range(300):
-            self.location_abbrev[i] = 0
+        # Location visit counts for abbreviation, indexed by location
+        self.location_abbrev = bytearray(BASE_LOCATION_ABBREV)
         
         # Player state
         self.location = 1  # Start at end of road
@@ -43,9 +104,9 @@ class Adventure:
         
         # Dwarf state
         self.dwarf_stage = 0  # 0=not started, 1=waiting, 2+=active
-        self.dwarf_locations = [0, 0, 0]
-        self.old_dwarf_locations = [0, 0, 0]
-        self.dwarf_seen = [False, False, False]
+        self.dwarf_locations = array('h', [0, 0, 0])
+        self.old_dwarf_locations = array('h', [0, 0, 0])
+        self.dwarf_seen = bytearray(3)
         
         # Game flags
         self.first_time = True
@@ -54,20 +115,185 @@ class Adventure:
         
         # Grate state
         self.grate_locked = True
+        
+        # Session state
+        self.game_over = False
+        self.trouble_count = 0
+        self.pending_question = None  # Message ID of an unanswered yes/no question
+        self.output = output if output is not None else OutputBuffer()
+        
+        # Random stream used by every chance event in this game
+        self.rng = GameRandom(seed)
+        
+        self.save_file = save_file
+    
+    def save(self):
+        """Return the game state as a compact binary blob"""
+        return savegame.pack(self)
+    
+    def restore(self, data):
+        """Replace the game state with a blob returned by save()
+        
+        Raises savegame.SaveError if the blob can't be loaded.
+        """
+        savegame.unpack(self, data)
+        self.atloc, self.link = index_objects(self.object_place)
+    
+    def fork(self, output=None):
+        """Return an independent copy of this game.
+        
+        The state is a few small arrays, so copying them outright is about
+        as cheap as any copy-on-write scheme. The child continues the same
+        random stream, starts with empty output and has saving disabled.
+        """
+        child = Adventure.__new__(type(self))
+        child.object_place = self.object_place[:]
+        child.object_props = self.object_props[:]
+        child.location_abbrev = self.location_abbrev[:]
+        child.atloc = self.atloc[:]
+        child.link = self.link[:]
+        child.location = self.location
+        child.old_location = self.old_location
+        child.lamp_on = self.lamp_on
+        child.dwarf_stage = self.dwarf_stage
+        child.dwarf_locations = self.dwarf_locations[:]
+        child.old_dwarf_locations = self.old_dwarf_locations[:]
+        child.dwarf_seen = self.dwarf_seen[:]
+        child.first_time = self.first_time
+        child.west_count = self.west_count
+        child.detail_count = self.detail_count
+        child.grate_locked = self.grate_locked
+        child.game_over = self.game_over
+        child.trouble_count = self.trouble_count
+        child.pending_question = self.pending_question
+        child.output = output if output is not None else OutputBuffer()
+        child.rng = GameRandom(self.rng.getstate())
+        child.save_file = None
+        return child
+    
+    def objects_at(self, place):
+        """Yield the objects at a location (-1 = carried) in object order"""
+        obj = self.atloc[place]
+        while obj:
+            yield obj
+            obj = self.link[obj]
+    
+    def move_object(self, obj, place):
+        """Move an object to a location (-1 = carried, 0 = nowhere)"""
+        link = self.link
+        atloc = self.atloc
+        
+        # Unlink from the old location
+        old_place = self.object_place[obj]
+        prev = 0
+        cur = atloc[old_place]
+        while cur != obj:
+            prev = cur
+            cur = link[cur]
+        if prev:
+            link[prev] = link[obj]
+        else:
+            atloc[old_place] = link[obj]
+        
+        # Insert at the new location, keeping object order
+        prev = 0
+        cur = atloc[place]
+        while cur and cur < obj:
+            prev = cur
+            cur = link[cur]
+        link[obj] = cur
+        if prev:
+            link[prev] = obj
+        else:
+            atloc[place] = obj
+        
+        self.object_place[obj] = place
     
     def run(self):
-        """Main game loop"""
-        # Initial instructions
-        if yes_no_question(65, 0, 0, messages):
-            self.show_instructions()
+        """Terminal front-end: feed stdin lines to step(), output goes to stdout"""
+        self.output.sink = sys.stdout.write
+        self.start()
+        
+        while not self.game_over:
+            try:
+                line = input("> ")
+            except EOFError:
+                print("\nGoodbye!")
+                return
+            
+            self.step(line)
+    
+    def write(self, text=""):
+        """Append a line to the current turn's output"""
+        self.output.write(text)
+    
+    def start(self):
+        """Begin the game and return the opening output"""
+        self.ask(65)
+        return self.output.flush()
+    
+    def step(self, command):
+        """Process one line of player input.
+        
+        Never reads stdin, prints or exits; returns (output, game_over).
+        The output is also sent to the output buffer's sink, if it has one.
+        """
+        if self.game_over:
+            return "", True
+        metrics = self.metrics
+        if metrics is not None:
+            metrics.begin(self)
+        
+        word1, word2 = split_command(command)
+        
+        if self.pending_question is not None:
+            self.answer(word1)
+        elif word1 is not None:
+            if self.handle_command(word1, word2):
+                self.turn()
+        
+        if metrics is not None:
+            metrics.end()
+        return self.output.flush(), self.game_over
+    
+    def ask(self, question_msg):
+        """Pose a yes/no question; the next input line answers it"""
+        speak(question_msg, messages, self.write)
+        self.pending_question = question_msg
+    
+    def answer(self, response):
+        """Resolve the pending yes/no question"""
+        if response in ['YES', 'Y']:
+            agreed = True
+        elif response in ['NO', 'N']:
+            agreed = False
+        else:
+            self.write("Please answer YES or NO.")
+            return
+        
+        question = self.pending_question
+        self.pending_question = None
+        yes_msg, no_msg = question_responses[question]
+        reply_msg = yes_msg if agreed else no_msg
+        if reply_msg:
+            speak(reply_msg, messages, self.write)
         
-        # Main game loop
-        while True:
+        if question == 65:  # Instructions
+            if agreed:
+                self.show_instructions()
             self.turn()
+        elif question == 100:  # Quit
+            if agreed:
+                self.write("OK. Goodbye!")
+                self.game_over = True
+        else:  # Contextual help
+            if not agreed:
+                self.trouble_count = 0
+            speak(self.rng.choice([60, 61, 13]), messages, self.write)
     
     def show_instructions(self):
         """Show game instructions"""
-        print("""
+        self.write("""
 Somewhere nearby is Colossal Cave, where others have found fortunes in
 treasure and gold, though it is rumored that some who enter are never
 seen again. Magic is said to work in the cave. I will be your eyes
@@ -80,10 +306,25 @@ features of the current program were added by Don Woods.
         """)
     
     def turn(self):
-        """Execute one game turn"""
+        """Start a new game turn: move dwarves and describe the location"""
+        metrics = self.metrics
+        if metrics is not None:
+            started = metrics.mark()
+        self.trouble_count = 0
+        
         # Check for dwarves
         self.check_dwarves()
+        if metrics is not None:
+            started = metrics.mark("dwarves", started)
+        if self.game_over:
+            return
         
+        self.arrive()
+        if metrics is not None:
+            metrics.mark("render", started)
+    
+    def arrive(self):
+        """Settle forced moves, then describe the location and count the visit"""
         # Check if this is a forced-move location (error messages that auto-return)
         # Locations 20-26 are error messages that immediately send you elsewhere
         if 20 <= self.location <= 26:
@@ -91,107 +332,221 @@ features of the current program were added by Don Woods.
             if self.location in travel_table and 1 in travel_table[self.location]:
                 self.location = travel_table[self.location][1]
         
-        # Describe location
-        is_dark = not can_see(self.location, self.object_place.get(LAMP),
+        self.describe_surroundings()
+        
+        # Update abbreviation counter
+        self.location_abbrev[self.location] = (self.location_abbrev[self.location] + 1) % 5
+    
+    def describe_surroundings(self):
+        """Describe the location and the objects here, or the darkness"""
+        is_dark = not can_see(self.location, self.object_place[LAMP],
                              self.lamp_on, location_conditions)
         
         if is_dark:
-            speak(16, messages)
-        else:
-            # Show location description
-            describe_location(self.location, long_descriptions, short_descriptions,
-                            self.location_abbrev.get(self.location, 0), False)
-            # Show objects at location
-            describe_objects(self.location, None, self.object_place,
-                           self.object_props, object_descriptions)
+            speak(16, messages, self.write)
+            return
         
-        # Update abbreviation counter
-        if self.location in self.location_abbrev:
-            self.location_abbrev[self.location] = (self.location_abbrev[self.location] + 1) % 5
-        else:
-            self.location_abbrev[self.location] = 1
+        # Location description, then the objects here, as one output block
+        location = self.location
+        long = self.location_abbrev[location] == 0
+        key = location * 2 + long
+        text = LOCATION_TEXT.get(key)
+        if text is None:
+            text = LOCATION_TEXT[key] = render_location(location, long_descriptions,
+                                                        short_descriptions, long)
+        
+        parts = [text] if text else []
+        objects = self.describe_objects(location)
+        if objects:
+            parts += objects
+            parts.append("")  # Blank line after the objects
+        if parts:
+            self.write("\n".join(parts))
+    
+    def describe_objects(self, location):
+        """Return the description lines of the objects at a location"""
+        lines = []
+        props = self.object_props
+        for obj in self.objects_at(location):
+            key = obj << 8 | props[obj]
+            line = OBJECT_TEXT.get(key)
+            if line is None:
+                line = OBJECT_TEXT[key] = render_object(obj, props[obj],
+                                                        object_descriptions)
+            if line:
+                lines.append(line)
+        return lines
+    
+    def handle_command(self, word1, word2):
+        """Carry out one command; returns True if it used up the turn"""
+        metrics = self.metrics
+        if metrics is None:
+            return self.dispatch(word1, word2, *self.parse(word1, word2))
+        
+        started = metrics.mark()
+        parsed = self.parse(word1, word2)
+        started = metrics.parsed(parsed, started)
+        consumed = self.dispatch(word1, word2, *parsed)
+        metrics.mark("handler", started)
+        return consumed
+    
+    @staticmethod
+    def parse(word1, word2):
+        """Look up the words of a command; returns (word type, code, second
+        word type, second code), with types of None for unknown words"""
+        word_type, code, _ = parse_command(word1, word2, vocabulary)
+        word_type2 = code2 = None
+        if word2 and word_type in (1, 2):
+            word_type2, code2, _ = parse_command(word2, None, vocabulary)
+        return word_type, code, word_type2, code2
+    
+    def dispatch(self, word1, word2, word_type, code, word_type2, code2):
+        """Carry out a parsed command; returns True if it used up the turn"""
+        # Special handling for "ENTER STREAM/WATER"
+        if word1 == "ENTER" and word2 in ["STREAM", "WATER"]:
+            speak(70, messages, self.write)
+            return False
         
-        # Get command
-        trouble_count = 0
-        while True:
-            word1, word2 = get_input()
-            
-            if word1 is None:
-                continue
-            
-            # Special handling for "ENTER STREAM/WATER"
-            if word1 == "ENTER" and word2 in ["STREAM", "WATER"]:
-                speak(70, messages)
-                continue
-            
-            # Parse command
-            word_type, code, remaining = parse_command(word1, word2, vocabulary)
-            
-            if word_type is None:
-                # Unknown word
-                trouble_count += 1
-                if trouble_count >= 3:
-                    if not self.offer_help():
-                        trouble_count = 0
-                msg_id = random.choice([60, 61, 13])
-                speak(msg_id, messages)
-                continue
-            
-            # Process command based on type
-            if word_type == 0:  # Motion
-                if self.do_motion(code):
-                    break
-            elif word_type == 1:  # Object
-                # Need a verb
+        if word_type is None:
+            # Unknown word; only reaching 3 matters, and the count must fit
+            # in a byte of save()
+            self.trouble_count = min(self.trouble_count + 1, 3)
+            if self.trouble_count >= 3:
+                if self.offer_help():
+                    return False
+                self.trouble_count = 0
+            msg_id = self.rng.choice([60, 61, 13])
+            speak(msg_id, messages, self.write)
+            return False
+        
+        # Process command based on type
+        if word_type == 0:  # Motion
+            return self.do_motion(code)
+        elif word_type == 1:  # Object
+            # Need a verb
+            if word_type2 == 2:  # Action verb
+                return self.do_action(code2, code)
+            self.write(f"What do you want to do with the {word1}?")
+        elif word_type == 2:  # Action verb
+            if code == 3:  # Inventory
+                list_inventory(self.objects_at(-1), self.write)
+            elif code == 10:  # Look
+                self.location_abbrev[self.location] = 0
+                return True
+            elif code == 17:  # List available movements
+                self.list_commands()
+            elif code == 18:  # Show location number
+                self.write(f"You are at location {self.location}.")
+            elif code == 19:  # Save
+                self.save_to_file()
+            elif code == 20:  # Restore
+                self.restore_from_file()
+            elif code == 21:  # Go to a named room
                 if word2:
-                    word_type2, code2, _ = parse_command(word2, None, vocabulary)
-                    if word_type2 == 2:  # Action verb
-                        if self.do_action(code2, code):
-                            break
-                    else:
-                        print(f"What do you want to do with the {word1}?")
+                    return self.travel_to(word2)
+                self.write(f"{word1} where?")
+            elif code == 22:  # Show turn statistics
+                if self.metrics is None:
+                    self.write("Statistics are not being collected.")
                 else:
-                    print(f"What do you want to do with the {word1}?")
-            elif word_type == 2:  # Action verb
-                if code == 3:  # Inventory
-                    list_inventory(self.object_place)
-                elif code == 10:  # Look
-                    self.location_abbrev[self.location] = 0
-                    break
-                elif code == 17:  # List available movements
-                    list_available_movements(self.location, travel_table, vocabulary, self.object_place)
-                elif code == 18:  # Show location number
-                    print(f"You are at location {self.location}.")
+                    self.write(self.metrics.report())
+            else:
+                # Need an object
+                if word2:
+                    if word_type2 == 1:  # Object
+                        return self.do_action(code, code2)
                 else:
-                    # Need an object
-                    if word2:
-                        word_type2, code2, _ = parse_command(word2, None, vocabulary)
-                        if word_type2 == 1:  # Object
-                            if self.do_action(code, code2):
-                                break
-                        else:
-                            print(f"{word1} what?")
-                    else:
-                        # Try to infer object
-                        if self.infer_object(code):
-                            break
-                        else:
-                            print(f"{word1} what?")
+                    # Try to infer object
+                    if self.infer_object(code):
+                        return True
+                self.write(f"{word1} what?")
+        return False
+    
+    def save_to_file(self):
+        """SAVE command: write the game to the save file"""
+        if self.save_file is None:
+            self.write("Saving is not available here.")
+            return
+        
+        try:
+            with open(self.save_file, "wb") as f:
+                f.write(self.save())
+        except OSError as e:
+            self.write(f"I can't save the game: {e.strerror}.")
+            return
+        self.write("Game saved.")
+    
+    def restore_from_file(self):
+        """RESTORE command: load the game from the save file"""
+        if self.save_file is None:
+            self.write("Restoring is not available here.")
+            return
+        
+        try:
+            with open(self.save_file, "rb") as f:
+                self.restore(f.read())
+        except OSError as e:
+            self.write(f"I can't restore the game: {e.strerror}.")
+            return
+        except savegame.SaveError:
+            self.write("That isn't a game I can restore.")
+            return
+        self.write("Game restored.")
+        self.write()
+        self.describe_surroundings()
+    
+    def travel_to(self, room):
+        """GOTO: walk the shortest route to a room, one turn per move.
+        
+        The walk stops early if something gets in the way, such as a
+        dwarf or an unexpected destination.
+        """
+        grate_open = self.object_props[GRATE] == 1
+        index = routing.get_index()
+        routes = []
+        for target in routing.find_rooms(room):
+            route = index.route(self.location, target, grate_open)
+            if route is not None:
+                routes.append(route)
+        
+        if not routes:
+            self.write("I don't know how to get there from here.")
+            return False
+        route = min(routes, key=len)
+        if not route:
+            self.write("You're already there.")
+            return False
+        
+        for i, (motion, expected) in enumerate(route):
+            if i:
+                self.turn()
+                if self.game_over or self.location in self.dwarf_locations:
+                    return False
+            self.do_motion(motion)
+            if self.location != expected:
+                break
+        return True
+    
+    def list_commands(self):
+        """List the exits, objects and general commands for this location"""
+        if self.location not in EXIT_LISTINGS:
+            EXIT_LISTINGS[self.location] = render_exits(self.location, travel_table,
+                                                        MOTION_WORDS)
+        list_available_movements(EXIT_LISTINGS[self.location], OBJECT_WORDS,
+                                 self.objects_at(self.location), self.write)
     
     def do_motion(self, motion_code):
         """Handle movement commands"""
         # Special motion codes
         if motion_code == 17:  # QUIT
-            if yes_no_question(100, 0, 0, messages):
-                print("OK. Goodbye!")
-                sys.exit(0)
+            self.ask(100)
             return False
         
         # Track west commands
         if motion_code == 4:  # WEST
             self.west_count += 1
             if self.west_count == 10:
-                speak(17, messages)
+                speak(17, messages, self.write)
         
         # Check travel table
         if self.location in travel_table and motion_code in travel_table[self.location]:
@@ -206,7 +561,7 @@ features of the current program were added by Don Woods.
             return True
         else:
             # Can't go that way
-            speak(12, messages)
+            speak(12, messages, self.write)
             return False
     
     def handle_special_location(self, special_code):
@@ -214,23 +569,23 @@ features of the current program were added by Don Woods.
         offset = special_code - 300
         
         if offset == 0:  # Random choice between two locations (300)
-            return 5 if random_chance(0.5) else 6
+            return 5 if random_chance(0.5, self.rng) else 6
         elif offset == 1:  # Grate check going down (301)
-            return 9 if self.object_props.get(GRATE, 0) == 1 else 23
+            return 9 if self.object_props[GRATE] == 1 else 23
         elif offset == 2:  # Grate check going up (302)
-            return 8 if self.object_props.get(GRATE, 0) == 1 else 25
+            return 8 if self.object_props[GRATE] == 1 else 25
         elif offset == 3:  # Pit check (303)
-            return 15 if self.object_props.get(GRATE, 0) == 1 else 14
+            return 15 if self.object_props[GRATE] == 1 else 14
         else:
             return self.location
     
     def do_action(self, verb_code, obj_code):
         """Handle action verbs"""
-        obj_location = self.object_place.get(obj_code, 0)
+        obj_location = self.object_place[obj_code]
         
         # Check if object is present
         if obj_location != self.location and obj_location != -1:
-            print(f"I don't see that here.")
+            self.write(f"I don't see that here.")
             return False
         
         # TAKE/CARRY
@@ -261,10 +616,10 @@ features of the current program were added by Don Woods.
         elif verb_code == 9:
             if obj_code == 12:  # Matches
                 self.object_props[12] = 1
-                print("The match flares up.")
+                self.write("The match flares up.")
                 return True
             else:
-                speak(54, messages)
+                speak(54, messages, self.write)
                 return False
         
         # ATTACK
@@ -282,129 +637,129 @@ features of the current program were added by Don Woods.
         # RUB
         elif verb_code == 15:
             if obj_code == LAMP:
-                speak(76, messages)
+                speak(76, messages, self.write)
             else:
-                speak(54, messages)
+                speak(54, messages, self.write)
             return False
         
         # POUR
         elif verb_code == 16:
             return self.do_pour(obj_code)
         
-        speak(54, messages)
+        speak(54, messages, self.write)
         return False
     
     def do_take(self, obj_code):
         """Take/carry an object"""
         if obj_code == 18:  # Water (special case)
-            speak(54, messages)
+            speak(54, messages, self.write)
             return False
         
-        obj_location = self.object_place.get(obj_code, 0)
+        obj_location = self.object_place[obj_code]
         
         if obj_location == -1:
-            print("You are already carrying it!")
+            self.write("You are already carrying it!")
             return False
         
         if obj_location != self.location:
-            print("I don't see that here.")
+            self.write("I don't see that here.")
             return False
         
         if self.fixed.get(obj_code, False):
-            speak(25, messages)
+            speak(25, messages, self.write)
             return False
         
         # Special cases
-        if obj_code == BIRD and self.object_place.get(ROD, 0) == -1:
-            speak(26, messages)
+        if obj_code == BIRD and self.object_place[ROD] == -1:
+            speak(26, messages, self.write)
             return False
         
         # Take the object
-        self.object_place[obj_code] = -1
-        speak(54, messages)
+        self.move_object(obj_code, -1)
+        speak(54, messages, self.write)
         return True
     
     def do_drop(self, obj_code):
         """Drop an object"""
         if obj_code == 18:  # Water (special case)
-            speak(54, messages)
+            speak(54, messages, self.write)
             return False
         
-        if self.object_place.get(obj_code, 0) != -1:
-            print("You aren't carrying it!")
+        if self.object_place[obj_code] != -1:
+            self.write("You aren't carrying it!")
             return False
         
         # Special case: bird and snake
-        if obj_code == BIRD and self.location == 19 and self.object_props.get(SNAKE, 0) == 0:
-            speak(30, messages)
+        if obj_code == BIRD and self.location == 19 and self.object_props[SNAKE] == 0:
+            speak(30, messages, self.write)
             self.object_props[SNAKE] = 1
         
-        self.object_place[obj_code] = self.location
-        speak(54, messages)
+        self.move_object(obj_code, self.location)
+        speak(54, messages, self.write)
         return True
     
     def do_lock(self, obj_code):
         """Lock something"""
         if obj_code == GRATE:
-            if self.object_place.get(KEYS, 0) not in [self.location, -1]:
-                speak(33, messages)
+            if self.object_place[KEYS] not in [self.location, -1]:
+                speak(33, messages, self.write)
                 return False
             
-            if self.object_props.get(GRATE, 0) == 1:
-                speak(35, messages)
+            if self.object_props[GRATE] == 1:
+                speak(35, messages, self.write)
                 self.object_props[GRATE] = 0
                 return True
             else:
-                speak(36, messages)
+                speak(36, messages, self.write)
                 return False
         else:
-            speak(28, messages)
+            speak(28, messages, self.write)
             return False
     
     def do_unlock(self, obj_code):
         """Unlock something"""
         if obj_code == GRATE:
-            if self.object_place.get(KEYS, 0) not in [self.location, -1]:
-                speak(33, messages)
+            if self.object_place[KEYS] not in [self.location, -1]:
+                speak(33, messages, self.write)
                 return False
             
-            if self.object_props.get(GRATE, 0) == 0:
-                speak(37, messages)
+            if self.object_props[GRATE] == 0:
+                speak(37, messages, self.write)
                 self.object_props[GRATE] = 1
                 return True
             else:
-                speak(36, messages)
+                speak(36, messages, self.write)
                 return False
         else:
-            speak(28, messages)
+            speak(28, messages, self.write)
             return False
     
     def do_light(self, obj_code):
         """Light the lamp"""
         if obj_code != LAMP:
-            print("You can't light that!")
+            self.write("You can't light that!")
             return False
         
-        if self.object_place.get(LAMP, 0) not in [self.location, -1]:
-            print("I don't see a lamp here.")
+        if self.object_place[LAMP] not in [self.location, -1]:
+            self.write("I don't see a lamp here.")
             return False
         
         self.lamp_on = True
-        speak(39, messages)
+        speak(39, messages, self.write)
         return True
     
     def do_extinguish(self, obj_code):
         """Extinguish the lamp"""
         if obj_code != LAMP:
-            print("You can't extinguish that!")
+            self.write("You can't extinguish that!")
             return False
         
-        if self.object_place.get(LAMP, 0) not in [self.location, -1]:
-            print("I don't see a lamp here.")
+        if self.object_place[LAMP] not in [self.location, -1]:
+            self.write("I don't see a lamp here.")
             return False
         
         self.lamp_on = False
-        speak(40, messages)
+        speak(40, messages, self.write)
         return True
     
     def do_attack(self, obj_code):
@@ -412,64 +767,62 @@ features of the current program were added by Don Woods.
         # Check for dwarves first
         for i in range(3):
             if self.dwarf_seen[i]:
-                if random_chance(0.4):
+                if random_chance(0.4, self.rng):
                     self.dwarf_seen[i] = False
                     self.dwarf_locations[i] = 0
                     self.old_dwarf_locations[i] = 0
-                    speak(47, messages)
+                    speak(47, messages, self.write)
                 else:
-                    speak(48, messages)
+                    speak(48, messages, self.write)
                 return True
         
         if obj_code == SNAKE:
-            print("Attacking the snake is pointless.")
+            self.write("Attacking the snake is pointless.")
             return False
         elif obj_code == BIRD:
-            speak(45, messages)
-            self.object_place[BIRD] = 0
+            speak(45, messages, self.write)
+            self.move_object(BIRD, 0)
             return True
         else:
-            speak(44, messages)
+            speak(44, messages, self.write)
             return False
     
     def do_eat(self, obj_code):
         """Eat something"""
         if obj_code == FOOD:
-            if self.object_place.get(FOOD, 0) in [self.location, -1]:
-                if self.object_props.get(FOOD, 0) == 0:
+            if self.object_place[FOOD] in [self.location, -1]:
+                if self.object_props[FOOD] == 0:
                     self.object_props[FOOD] = 1
-                    speak(72, messages)
+                    speak(72, messages, self.write)
                     return True
-        speak(54, messages)
+        speak(54, messages, self.write)
         return False
     
     def do_drink(self, obj_code):
         """Drink something"""
         if obj_code == WATER:
-            if self.object_place.get(WATER, 0) in [self.location, -1]:
-                if self.object_props.get(WATER, 0) == 0:
+            if self.object_place[WATER] in [self.location, -1]:
+                if self.object_props[WATER] == 0:
                     self.object_props[WATER] = 1
-                    speak(74, messages)
+                    speak(74, messages, self.write)
                     return True
-        speak(54, messages)
+        speak(54, messages, self.write)
         return False
     
     def do_pour(self, obj_code):
         """Pour something"""
         if obj_code == WATER:
             self.object_props[WATER] = 1
-            speak(78, messages)
+            speak(78, messages, self.write)
             return True
-        speak(54, messages)
+        speak(54, messages, self.write)
         return False
     
     def infer_object(self, verb_code):
         """Try to infer object from context"""
         # For single-object rooms, infer the object
-        objects_here = []
-        for obj_id, obj_loc in self.object_place.items():
-            if obj_loc == self.location or obj_loc == -1:
-                objects_here.append(obj_id)
+        objects_here = list(self.objects_at(self.location))
+        objects_here.extend(self.objects_at(-1))
         
         if len(objects_here) == 1 and verb_code not in [3, 10]:  # Not inventory or look
             return self.do_action(verb_code, objects_here[0])
@@ -477,46 +830,54 @@ features of the current program were added by Don Woods.
         return False
     
     def offer_help(self):
-        """Offer contextual help"""
+        """Offer contextual help; returns True if a question was asked"""
         # At grate
-        if self.location == 8 and self.object_props.get(GRATE, 0) == 0:
-            if yes_no_question(62, 63, 54, messages):
-                return True
+        if self.location == 8 and self.object_props[GRATE] == 0:
+            self.ask(62)
+            return True
         
         # With bird and pit
-        if self.location == 13 and self.object_place.get(BIRD, 0) == 13 and \
-           self.object_place.get(ROD, 0) != -1:
-            if yes_no_question(18, 19, 54, messages):
-                return True
+        if self.location == 13 and self.object_place[BIRD] == 13 and \
+           self.object_place[ROD] != -1:
+            self.ask(18)
+            return True
         
         # With snake
-        if self.location == 19 and self.object_props.get(SNAKE, 0) == 0 and \
-           self.object_place.get(BIRD, 0) == -1:
-            if yes_no_question(20, 21, 54, messages):
-                return True
+        if self.location == 19 and self.object_props[SNAKE] == 0 and \
+           self.object_place[BIRD] == -1:
+            self.ask(20)
+            return True
         
         return False
     
     def check_dwarves(self):
         """Handle dwarf encounters"""
+        self.dwarf_encounter(*self.move_dwarves())
+    
+    def move_dwarves(self):
+        """Advance the dwarves one turn, without any output
+        
+        Returns (appeared, present, attacks, hits): whether the dwarves
+        first showed up, how many are in the room, how many throw knives
+        and how many knives hit. dwarves.DwarfBatch does the same for many
+        games at once.
+        """
         # Start dwarves at location 15
         if self.dwarf_stage == 0:
             if self.location == 15:
                 self.dwarf_stage = 1
-            return
+            return False, 0, 0, 0
         
         # Initial delay
         if self.dwarf_stage == 1:
-            if random_chance(0.05):
+            if random_chance(0.05, self.rng):
                 self.dwarf_stage = 2
                 for i in range(3):
                     self.dwarf_locations[i] = 0
                     self.old_dwarf_locations[i] = 0
                     self.dwarf_seen[i] = False
-                speak(3, messages)
-                # Place axe
-                self.object_place[AXE] = self.location
-            return
+                return True, 0, 0, 0
+            return False, 0, 0, 0
         
         # Move dwarves
         self.dwarf_stage += 1
@@ -546,50 +907,59 @@ features of the current program were added by Don Woods.
                 
                 if self.old_dwarf_locations[i] == self.dwarf_locations[i]:
                     attack_count += 1
-                    if random_chance(0.1):
+                    if random_chance(0.1, self.rng):
                         hit_count += 1
         
+        return False, dwarves_present, attack_count, hit_count
+    
+    def dwarf_encounter(self, appeared, dwarves_present, attack_count, hit_count):
+        """Describe what the dwarves did this turn (see move_dwarves)"""
+        if appeared:
+            speak(3, messages, self.write)
+            # Place axe
+            self.move_object(AXE, self.location)
+            return
+        
         if dwarves_present == 0:
             return
         
         # Describe encounter
         if dwarves_present == 1:
-            speak(4, messages)
+            speak(4, messages, self.write)
         else:
-            print(f"There are {dwarves_present} threatening little dwarves in the room with you!")
-            print()
+            self.write(f"There are {dwarves_present} threatening little dwarves in the room with you!")
+            self.write()
         
         # Handle attacks
         if attack_count > 0:
             if attack_count == 1:
-                speak(5, messages)
+                speak(5, messages, self.write)
                 if hit_count > 0:
-                    speak(52, messages)
-                    print("\nGame over!")
-                    sys.exit(0)
+                    speak(52, messages, self.write)
+                    self.write("\nGame over!")
+                    self.game_over = True
             else:
-                print(f"{attack_count} of them throw knives at you!")
-                print()
+                self.write(f"{attack_count} of them throw knives at you!")
+                self.write()
                 if hit_count > 0:
                     if hit_count == 1:
-                        speak(6, messages)
+                        speak(6, messages, self.write)
                     else:
-                        print(f"{hit_count} of them get you!")
-                        print()
-                    print("Game over!")
-                    sys.exit(0)
+                        self.write(f"{hit_count} of them get you!")
+                        self.write()
+                    self.write("Game over!")
+                    self.game_over = True
                 else:
-                    speak(7, messages)
+                    speak(7, messages, self.write)
 
 
 def main():
     """Main entry point"""
-    print("=" * 60)
-    print("    COLOSSAL CAVE ADVENTURE")
-    print("=" * 60)
-    print()
+    sys.stdout.write("=" * 60 + "\n"
+                     "    COLOSSAL CAVE ADVENTURE\n"
+                     + "=" * 60 + "\n\n")
     
-    game = Adventure()
+    game = Adventure(save_file=SAVE_FILE)
     try:
         game.run()
     except KeyboardInterrupt:
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Monte Carlo dwarf lethality analyzer for Colossal Cave Adventure
+
+Walks a route through the cave under many random seeds and reports, turn
+by turn, how often the dwarves have appeared, how many knives they have
+thrown and how many players they have killed. Only the dwarves are
+simulated, with the game's own rules (Adventure.move_dwarves, or
+dwarves.DwarfBatch when NumPy is available), and the trials are spread
+over a process pool.
+
+The route is given as rooms to visit in order, by number or by a word of
+their short description, as for GOTO; the player walks the shortest path
+between them from the end of the road, one turn per move, with the grate
+open, optionally waiting in the last room. Trial n uses seed n (plus
+--seed), so Adventure(seed=n) meets the same dwarves on the same walk.
+
+    python balance.py mists 41 --linger 30 --trials 1000000
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+import dwarves
+import routing
+from adventure import Adventure
+
+START = 1
+CHUNK = 20000  # Trials per pool task
+
+
+def plan_route(waypoints, start=START, grate_open=True):
+    """Return the locations of each turn walking through waypoints in order"""
+    index = routing.get_index()
+    route = [start]
+    for waypoint in waypoints:
+        rooms = routing.find_rooms(waypoint.upper())
+        if not rooms:
+            raise ValueError(f"no room matches {waypoint!r}")
+        # Of several matching rooms, head for the nearest
+        reachable = [(index.distance(route[-1], room, grate_open), room) for room in rooms]
+        reachable = [(distance, room) for distance, room in reachable if distance is not None]
+        if not reachable:
+            raise ValueError(f"can't reach {waypoint!r} from location {route[-1]}")
+        moves = index.route(route[-1], min(reachable)[1], grate_open)
+        route.extend(location for _, location in moves)
+    return route
+
+
+def new_stats(turns):
+    """Empty totals for a route of the given number of turns"""
+    return {
+        "trials": 0,
+        "appeared": [0] * turns,    # Trials where the dwarves first show up, by turn
+        "encounters": [0] * turns,  # Trials with dwarves in the room, by turn
+        "knives": [0] * turns,      # Knives thrown, by turn
+        "deaths": [0] * turns,      # Trials ending in death, by turn
+        "knives_per_trial": {},     # Knives thrown in a trial -> trials
+    }
+
+
+def merge_stats(total, stats):
+    """Add the totals of stats into total"""
+    total["trials"] += stats["trials"]
+    for key in ("appeared", "encounters", "knives", "deaths"):
+        total[key] = [a + b for a, b in zip(total[key], stats[key])]
+    for knives, trials in stats["knives_per_trial"].items():
+        total["knives_per_trial"][knives] = total["knives_per_trial"].get(knives, 0) + trials
+    return total
+
+
+def simulate(route, first_seed, count):
+    """Run trials one by one through Adventure.move_dwarves"""
+    stats = new_stats(len(route))
+    histogram = stats["knives_per_trial"]
+    for seed in range(first_seed, first_seed + count):
+        game = Adventure(seed=seed)
+        thrown = 0
+        for turn, location in enumerate(route):
+            game.location = location
+            appeared, present, attacks, hits = game.move_dwarves()
+            if appeared:
+                stats["appeared"][turn] += 1
+            if present:
+                stats["encounters"][turn] += 1
+                stats["knives"][turn] += attacks
+                thrown += attacks
+                if hits:
+                    stats["deaths"][turn] += 1
+                    break
+        histogram[thrown] = histogram.get(thrown, 0) + 1
+    stats["trials"] = count
+    return stats
+
+
+def simulate_batch(route, first_seed, count):
+    """Run trials together through dwarves.DwarfBatch"""
+    np = dwarves.np
+    stats = new_stats(len(route))
+    batch = dwarves.DwarfBatch(count, range(first_seed, first_seed + count))
+    alive = np.ones(count, dtype=np.bool_)
+    thrown = np.zeros(count, dtype=np.int32)
+    location = np.empty(count, dtype=np.int16)
+
+    for turn, here in enumerate(route):
+        location.fill(here)
+        appeared, present, attacks, hits = batch.step(location)
+        present = alive & (present > 0)
+        attacks = np.where(present, attacks, 0)
+        killed = present & (hits > 0)
+        stats["appeared"][turn] = int(np.count_nonzero(alive & appeared))
+        stats["encounters"][turn] = int(np.count_nonzero(present))
+        stats["knives"][turn] = int(attacks.sum())
+        stats["deaths"][turn] = int(np.count_nonzero(killed))
+        thrown += attacks
+        alive &= ~killed
+
+    knives, trials = np.unique(thrown, return_counts=True)
+    stats["knives_per_trial"] = dict(zip(knives.tolist(), trials.tolist()))
+    stats["trials"] = count
+    return stats
+
+
+def simulate_task(task):
+    """Pool worker: run one (route, first seed, count) chunk of trials"""
+    route, first_seed, count = task
+    if dwarves.np is None:
+        return simulate(route, first_seed, count)
+    return simulate_batch(route, first_seed, count)
+
+
+def analyze(route, trials, seed=0, jobs=None):
+    """Run trials over a process pool; returns the merged totals"""
+    tasks = [(route, first, min(CHUNK, seed + trials - first))
+             for first in range(seed, seed + trials, CHUNK)]
+    total = new_stats(len(route))
+    if jobs == 1:
+        for stats in map(simulate_task, tasks):
+            merge_stats(total, stats)
+        return total
+
+    with multiprocessing.Pool(jobs) as pool:
+        for stats in pool.imap_unordered(simulate_task, tasks):
+            merge_stats(total, stats)
+    return total
+
+
+def report(route, total, every):
+    """Return the per-turn table as text
+
+    appeared, knives (per trial) and dead are totals up to each turn; met
+    is the share of trials with dwarves in the room on that turn.
+    """
+    trials = total["trials"]
+    lines = [f"{'turn':>5} {'loc':>4} {'appeared':>9} {'met':>8} "
+             f"{'knives':>8} {'dead':>8}"]
+    appeared = knives = deaths = 0
+    for turn, location in enumerate(route):
+        appeared += total["appeared"][turn]
+        knives += total["knives"][turn]
+        deaths += total["deaths"][turn]
+        if turn % every == 0 or turn == len(route) - 1:
+            lines.append(f"{turn:5} {location:4} {appeared / trials:9.2%} "
+                         f"{total['encounters'][turn] / trials:8.2%} "
+                         f"{knives / trials:8.4f} {deaths / trials:8.2%}")
+
+    lines.append("")
+    lines.append("Knives thrown per trial:")
+    for thrown, count in sorted(total["knives_per_trial"].items()):
+        lines.append(f"  {thrown:3} {count / trials:9.4%}")
+    return "\n".join(lines)
+
+
+def main():
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description="Estimate dwarf lethality along a route")
+    parser.add_argument("rooms", nargs="+", help="rooms to visit in order")
+    parser.add_argument("--linger", type=int, default=0,
+                        help="extra turns spent in the last room")
+    parser.add_argument("--trials", type=int, default=100000, help="number of trials")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first trial")
+    parser.add_argument("--jobs", type=int, default=None,
+                        help="worker processes (default: one per core)")
+    parser.add_argument("--every", type=int, default=None,
+                        help="print every this many turns (default: about 20 rows)")
+    parser.add_argument("--json", metavar="FILE", help="write the totals as JSON")
+    args = parser.parse_args()
+    if args.trials < 1:
+        parser.error("--trials must be at least 1")
+
+    try:
+        route = plan_route(args.rooms)
+    except ValueError as e:
+        parser.error(str(e))
+    route += [route[-1]] * args.linger
+
+    started = time.perf_counter()
+    total = analyze(route, args.trials, args.seed, args.jobs)
+    elapsed = time.perf_counter() - started
+
+    print(f"Route of {len(route)} turns: {' '.join(map(str, route))}")
+    print(f"{args.trials} trials in {elapsed:.2f}s "
+          f"({'NumPy' if dwarves.np is not None else 'pure Python'}, "
+          f"{args.jobs or os.cpu_count()} workers)\n")
+    print(report(route, total, args.every or max(1, len(route) // 20)))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"route": route, **total}, f, indent=1)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
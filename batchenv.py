@@ -0,0 +1,142 @@
+"""
+Batched environment for training game-playing agents
+
+Steps N independent headless Adventure games with one call, one command
+per game, and returns their state as NumPy arrays. The games run the
+ordinary Adventure logic; only the bookkeeping around them is batched.
+
+NumPy is needed for this module only; the game itself has no dependencies.
+
+    env = BatchEnv(1024, seed=0)
+    obs = env.reset()
+    obs, reward, done, info = env.step(["W"] * 1024)
+    env.texts[obs["text"][0]]      # Output of game 0's last step
+
+Text ids index env.texts, which holds the distinct texts of the latest
+step() or reset() only, so its size stays bounded by the batch size.
+"""
+
+try:
+    import numpy as np
+except ImportError:  # Optional; see BatchEnv
+    np = None
+
+from adventure import Adventure
+from game_data import LOCATION_SLOTS, MAX_OBJECT
+
+
+class BatchEnv:
+    def __init__(self, size, seed=0, auto_reset=True):
+        """Set up size games; call reset() to start them.
+
+        Games get consecutive seeds starting at seed, including games
+        started later by auto_reset, so a run is reproducible.
+        """
+        if np is None:
+            raise ImportError("BatchEnv needs NumPy (pip install numpy)")
+        self.size = size
+        self.next_seed = seed
+        self.auto_reset = auto_reset
+        self.games = [None] * size
+        self.visited = [None] * size  # Per game: bytearray of visited locations
+
+        # Observation text ids: texts[text_id] is the output text, for the
+        # latest step() or reset() only
+        self.texts = []
+        self.text_ids = {}
+
+    def clear_texts(self):
+        """Forget the previous call's texts, starting ids from 0 again"""
+        self.texts = []
+        self.text_ids = {}
+
+    def encode(self, text):
+        """Return the id of an output text, assigning a new one if needed"""
+        text_id = self.text_ids.get(text)
+        if text_id is None:
+            text_id = self.text_ids[text] = len(self.texts)
+            self.texts.append(text)
+        return text_id
+
+    def new_game(self, i):
+        """Start a fresh game in slot i; returns the id of its opening text"""
+        game = Adventure(seed=self.next_seed)
+        self.next_seed += 1
+        # Decline the instructions so every game opens at the end of the road
+        text = game.start() + game.step("NO")[0]
+        self.games[i] = game
+        self.visited[i] = visited = bytearray(LOCATION_SLOTS)
+        visited[game.location] = 1
+        return self.encode(text)
+
+    def reset(self):
+        """Start new games in every slot; returns the observation"""
+        self.clear_texts()
+        return self.observe([self.new_game(i) for i in range(self.size)])
+
+    def step(self, commands):
+        """Send one command to each game.
+
+        Returns (observation, reward, done, info). The reward is 1.0 for
+        reaching a location the game had not visited before, else 0.0;
+        done is set when a game ends. With auto_reset, a finished game is
+        replaced at once: its observation row is the new game's, and
+        info["final_text"] holds the finished game's last text id (-1 for
+        games still running). Text ids are only valid until the next call.
+        """
+        if len(commands) != self.size:
+            raise ValueError(f"expected {self.size} commands, got {len(commands)}")
+
+        self.clear_texts()
+        text_ids = []
+        reward = np.zeros(self.size, dtype=np.float32)
+        done = np.zeros(self.size, dtype=np.bool_)
+        final_text = np.full(self.size, -1, dtype=np.int32)
+
+        for i, command in enumerate(commands):
+            game = self.games[i]
+            text, game_over = game.step(command)
+            text_id = self.encode(text)
+
+            visited = self.visited[i]
+            if not visited[game.location]:
+                visited[game.location] = 1
+                reward[i] = 1.0
+
+            if game_over:
+                done[i] = True
+                if self.auto_reset:
+                    final_text[i] = text_id
+                    text_id = self.new_game(i)
+            text_ids.append(text_id)
+
+        return self.observe(text_ids), reward, done, {"final_text": final_text}
+
+    def observe(self, text_ids):
+        """Gather the games' state into the observation arrays.
+
+        location: int16 location per game
+        carried: uint32 bitmask of carried objects (bit n = object n)
+        props: uint8 object properties, one row per game
+        text: int32 id of the last output text (see texts)
+        """
+        games = self.games
+        size = self.size
+        location = np.fromiter((game.location for game in games), np.int16, size)
+        carried = np.fromiter((carried_mask(game) for game in games), np.uint32, size)
+        props = np.frombuffer(b"".join([game.object_props for game in games]),
+                              dtype=np.uint8).reshape(size, MAX_OBJECT + 1)
+        return {
+            "location": location,
+            "carried": carried,
+            "props": props,
+            "text": np.array(text_ids, dtype=np.int32),
+        }
+
+
+def carried_mask(game):
+    """Bitmask of the objects a game's player carries"""
+    mask = 0
+    for obj in game.objects_at(-1):
+        mask |= 1 << obj
+    return mask
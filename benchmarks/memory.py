@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Per-session memory benchmark for Colossal Cave Adventure
+
+Uses tracemalloc to measure the bytes allocated per resident game, for the
+compact array-backed Adventure state and for the dict/list layout the
+engine used before.
+"""
+
+import argparse
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from adventure import Adventure
+from game_data import initial_placements, fixed_objects
+
+
+class DictState:
+    """The per-game state as it was laid out before the compact arrays"""
+
+    def __init__(self):
+        self.object_place = initial_placements.copy()
+        self.object_props = {}
+        for obj in self.object_place.keys():
+            self.object_props[obj] = 0
+        self.fixed = fixed_objects.copy()
+        self.location_abbrev = {}
+        for i in range(300):
+            self.location_abbrev[i] = 0
+        self.location = 1
+        self.old_location = 1
+        self.lamp_on = False
+        self.dwarf_stage = 0
+        self.dwarf_locations = [0, 0, 0]
+        self.old_dwarf_locations = [0, 0, 0]
+        self.dwarf_seen = [False, False, False]
+        self.first_time = True
+        self.west_count = 0
+        self.detail_count = 0
+        self.grate_locked = True
+        self.game_over = False
+        self.trouble_count = 0
+        self.pending_question = None
+        self.output = []
+
+
+def bytes_per_session(factory, count):
+    """Return the average traced allocation of one game made by factory"""
+    sessions = [None] * count
+    tracemalloc.start()
+    try:
+        start, _ = tracemalloc.get_traced_memory()
+        for i in range(count):
+            sessions[i] = factory()
+        end, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return (end - start) / count
+
+
+def main():
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description="Measure memory per game session")
+    parser.add_argument("--sessions", type=int, default=10000,
+                        help="number of resident sessions to create")
+    args = parser.parse_args()
+
+    before = bytes_per_session(DictState, args.sessions)
+    after = bytes_per_session(Adventure, args.sessions)
+
+    print(f"Sessions measured: {args.sessions}")
+    print(f"  dict-based state: {before:8.0f} bytes/session")
+    print(f"  compact state:    {after:8.0f} bytes/session")
+    print(f"  reduction:        {before / after:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for Colossal Cave Adventure's hot paths
+
+Times the engine's per-turn work, replay throughput, memory per session and
+the import times of game_data and the engine, prints the results and
+optionally writes them as JSON. Given a stored baseline, exits with status 1
+when any metric is worse than the baseline by more than the threshold.
+
+    python benchmarks/run.py --json baseline.json
+    python benchmarks/run.py --baseline baseline.json --threshold 0.2
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from adventure import Adventure
+from game_data import *
+from utils import *
+import replay
+from memory import bytes_per_session
+
+TRANSCRIPT_DIR = os.path.join(ROOT, "transcripts")
+
+
+def best_time(statement, number, repeat=5):
+    """Best time per call of statement, in microseconds"""
+    return min(timeit.repeat(statement, number=number, repeat=repeat)) / number * 1e6
+
+
+def scripted_game(seed=1):
+    """A game walked down to the hall of mists, with the lamp lit"""
+    game = Adventure(seed=seed)
+    game.start()
+    for command in ["NO", "IN", "TAKE KEYS", "TAKE LAMP", "OUT", "S", "S", "S",
+                    "UNLOCK GRATE", "LIGHT LAMP", "D", "W", "W", "W", "W", "W", "D"]:
+        game.step(command)
+    return game
+
+
+def bench_parse_command(number):
+    return best_time(lambda: parse_command("TAKE", "LAMP", vocabulary), number)
+
+
+def bench_step(number):
+    commands = ["W", "E", "LOOK", "INVENTORY"]
+    base = scripted_game()
+
+    def play():
+        game = base.fork()
+        for command in commands:
+            game.step(command)
+
+    return best_time(play, number // len(commands)) / len(commands)
+
+
+def bench_describe_objects(number):
+    game = scripted_game()
+    game.location = 3
+
+    return best_time(lambda: game.describe_objects(game.location), number)
+
+
+def bench_describe_surroundings(number):
+    game = scripted_game()
+    game.location = 3
+
+    def run():
+        game.describe_surroundings()
+        game.output.lines.clear()
+
+    return best_time(run, number)
+
+
+def bench_list_available_movements(number):
+    game = scripted_game()
+    game.location = 3
+
+    def run():
+        game.list_commands()
+        game.output.lines.clear()
+
+    return best_time(run, number)
+
+
+def bench_check_dwarves(number):
+    game = scripted_game()
+
+    def run():
+        game.dwarf_stage = 9
+        game.game_over = False
+        game.check_dwarves()
+        game.output.lines.clear()
+
+    return best_time(run, number)
+
+
+def bench_replay(number):
+    """Replay throughput over the sample transcripts, commands per second"""
+    paths = [os.path.join(TRANSCRIPT_DIR, name)
+             for name in sorted(os.listdir(TRANSCRIPT_DIR)) if name.endswith(".txt")]
+    tasks = [(os.path.basename(path), replay.read_transcript(path)) for path in paths]
+    commands = sum(len(task[1]) for task in tasks) * number
+
+    def run():
+        for _ in range(number):
+            for name, transcript in tasks:
+                replay.replay(name, transcript)
+
+    return commands / min(timeit.repeat(run, number=1, repeat=3))
+
+
+def bench_memory(number):
+    return bytes_per_session(Adventure, number)
+
+
+def import_time(module, number):
+    """Import time of a module in a fresh interpreter, in milliseconds"""
+    code = (f"import time; t = time.perf_counter(); import {module}; "
+            "print(time.perf_counter() - t)")
+    times = []
+    for _ in range(number):
+        output = subprocess.run([sys.executable, "-c", code], cwd=ROOT,
+                                capture_output=True, text=True, check=True).stdout
+        times.append(float(output) * 1000)
+    return min(times)
+
+
+def bench_import_game_data(number):
+    return import_time("game_data", number)
+
+
+def bench_import_adventure(number):
+    return import_time("adventure", number)
+
+
+# name -> (function, iterations, unit, higher is better)
+BENCHMARKS = {
+    "parse_command": (bench_parse_command, 200000, "us", False),
+    "step": (bench_step, 20000, "us", False),
+    "describe_objects": (bench_describe_objects, 100000, "us", False),
+    "describe_surroundings": (bench_describe_surroundings, 100000, "us", False),
+    "list_available_movements": (bench_list_available_movements, 50000, "us", False),
+    "check_dwarves": (bench_check_dwarves, 100000, "us", False),
+    "replay_throughput": (bench_replay, 200, "commands/s", True),
+    "memory_per_session": (bench_memory, 5000, "bytes", False),
+    "import_game_data": (bench_import_game_data, 5, "ms", False),
+    "import_adventure": (bench_import_adventure, 5, "ms", False),
+}
+
+
+def run_benchmarks(names=None, scale=1.0):
+    """Run the selected benchmarks; returns {name: {value, unit, higher_is_better}}"""
+    results = {}
+    for name, (function, number, unit, higher_is_better) in BENCHMARKS.items():
+        if names and name not in names:
+            continue
+        value = function(max(1, int(number * scale)))
+        results[name] = {"value": value, "unit": unit,
+                         "higher_is_better": higher_is_better}
+    return results
+
+
+def find_regressions(results, baseline, threshold):
+    """Return (name, baseline value, value) for metrics worse than threshold"""
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        before = baseline[name]["value"]
+        value = result["value"]
+        if result["higher_is_better"]:
+            worse = value < before * (1 - threshold)
+        else:
+            worse = value > before * (1 + threshold)
+        if worse:
+            regressions.append((name, before, value))
+    return regressions
+
+
+def main():
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description="Benchmark the engine's hot paths")
+    parser.add_argument("names", nargs="*", help="benchmarks to run (default: all)")
+    parser.add_argument("--json", metavar="FILE", help="write results as JSON")
+    parser.add_argument("--baseline", metavar="FILE",
+                        help="compare against results saved with --json")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="allowed relative regression (default: 0.2)")
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help="scale the iteration counts")
+    args = parser.parse_args()
+
+    unknown = set(args.names) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    results = run_benchmarks(args.names, args.scale)
+    for name, result in results.items():
+        print(f"{name:28} {result['value']:14.2f} {result['unit']}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=1)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = find_regressions(results, baseline, args.threshold)
+        if regressions:
+            print(f"\nRegressions beyond {args.threshold:.0%} of {args.baseline}:")
+            for name, before, value in regressions:
+                print(f"  {name}: {before:.2f} -> {value:.2f}")
+            return 1
+        print(f"\nNo regressions beyond {args.threshold:.0%} of {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
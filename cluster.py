@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+Multi-process game server for Colossal Cave Adventure
+
+A supervisor runs one GameServer per worker process, each hosting a shard
+of the sessions, behind a single listening port. The front end (the
+supervisor's own event loop) accepts each connection, asks for the session
+id if games are resumable, and hands the socket itself to the worker owning
+that session, chosen by consistent hashing of the id. From then on the
+worker talks to the client directly, so game traffic never passes through
+the front end and throughput grows with the number of workers.
+
+Each worker has its own journal directory and store file, and draws the ids
+of new sessions so that they hash to itself. The read-only game tables are
+exported once into shared memory (see sharedtables.py), which the workers
+attach to rather than building their own. A worker that dies is
+restarted, recovering its shard from its journal, while the others carry
+on serving.
+
+    python cluster.py --workers 4 --port 4000 --journal games/ --store games.db
+
+Takes the same options as server.py. Needs Unix (sockets are handed over
+with SCM_RIGHTS).
+"""
+
+import argparse
+import asyncio
+import bisect
+import hashlib
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+
+import sharedtables
+from server import BANNER, MAX_LINE, SESSION_PROMPT, build_parser, create_server
+
+
+REPLICAS = 100  # Points per worker on the hash ring
+HANDOFF_SIZE = 4096  # Largest handoff message: session line plus early input
+RESTART_DELAY = 1.0  # Seconds between checks for dead workers
+
+
+def ring_hash(key):
+    return int.from_bytes(hashlib.blake2b(str(key).encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    def __init__(self, nodes, replicas=REPLICAS):
+        """Consistent hash ring over nodes, each placed at replicas points"""
+        points = sorted((ring_hash(f"{node}#{i}"), node)
+                        for node in nodes for i in range(replicas))
+        self.hashes = [point for point, _ in points]
+        self.nodes = [node for _, node in points]
+
+    def node_for(self, key):
+        """The node owning key: the first one clockwise of its hash"""
+        i = bisect.bisect(self.hashes, ring_hash(key))
+        return self.nodes[i % len(self.nodes)]
+
+
+def shard_path(path, index):
+    """Per-worker variant of a file path: games.db -> games-0.db"""
+    root, ext = os.path.splitext(path)
+    return f"{root}-{index}{ext}"
+
+
+def worker_args(args, index):
+    """The server options of one worker, with its own journal, store and
+    metrics files"""
+    args = argparse.Namespace(**vars(args))
+    if args.journal:
+        args.journal = os.path.join(args.journal, f"worker-{index}")
+    if args.store:
+        args.store = shard_path(args.store, index)
+    if args.metrics:
+        args.metrics = shard_path(args.metrics, index)
+    return args
+
+
+def run_worker(index, count, channel, args):
+    """Worker process entry point: serve the connections handed to a shard"""
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    ring = HashRing(range(count))
+    server = create_server(args, owns=lambda session: ring.node_for(session) == index)
+    try:
+        asyncio.run(serve_handoffs(server, channel))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+
+
+async def serve_handoffs(server, channel):
+    """Adopt the client sockets sent over channel until the supervisor goes"""
+    loop = asyncio.get_running_loop()
+    closed = loop.create_future()
+    clients = set()  # The event loop only keeps weak references to tasks
+    channel.setblocking(False)
+
+    def receive():
+        while True:
+            try:
+                data, fds, _, _ = socket.recv_fds(channel, HANDOFF_SIZE, 1)
+            except BlockingIOError:
+                return
+            if not fds:
+                # End of file: the supervisor has exited
+                loop.remove_reader(channel.fileno())
+                if not closed.done():
+                    closed.set_result(None)
+                return
+            if server.store is not None:
+                line, _, pending = data.partition(b"\n")
+                line = line.decode("ascii", errors="ignore")
+            else:
+                line, pending = None, data
+            task = asyncio.ensure_future(adopt(server, socket.socket(fileno=fds[0]), line, pending))
+            clients.add(task)
+            task.add_done_callback(clients.discard)
+
+    loop.add_reader(channel.fileno(), receive)
+    server.start_evictor()
+    try:
+        await closed
+    finally:
+        server.stop_evictor()
+
+
+async def adopt(server, sock, line, pending):
+    """Run a handed-over client connection, starting with the input the
+    front end had already read past the session id"""
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader(limit=MAX_LINE, loop=loop)
+    reader.feed_data(pending)
+    protocol = asyncio.StreamReaderProtocol(reader, loop=loop)
+    transport, _ = await loop.connect_accepted_socket(lambda: protocol, sock)
+    writer = asyncio.StreamWriter(transport, protocol, reader, loop)
+    await server.handle_client(reader, writer, line)
+
+
+class Supervisor:
+    def __init__(self, args, workers):
+        """Front end for worker processes serving with the given options"""
+        self.args = args
+        self.count = workers
+        self.ring = HashRing(range(workers))
+        self.sessions = bool(args.journal or args.store)
+        self.workers = [None] * workers  # (process, channel) per shard
+        self.next_worker = 0
+        self.context = multiprocessing.get_context("spawn")
+        self.tables = None
+
+    def start_worker(self, index):
+        """Start, or restart, the worker of one shard"""
+        channel, worker_channel = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        process = self.context.Process(
+            target=run_worker, name=f"worker-{index}", daemon=True,
+            args=(index, self.count, worker_channel, worker_args(self.args, index)))
+        process.start()
+        worker_channel.close()
+        channel.setblocking(False)
+        self.workers[index] = (process, channel)
+
+    def start(self):
+        """Export the game tables for the workers to share, then start them"""
+        self.tables = sharedtables.export()
+        os.environ[sharedtables.ENV] = self.tables.name  # Inherited by workers
+        for index in range(self.count):
+            self.start_worker(index)
+
+    def stop(self):
+        """Stop the workers, letting them write out their games"""
+        for process, channel in self.workers:
+            channel.close()  # Workers finish once their channel is closed
+        for process, _ in self.workers:
+            process.join(10)
+            if process.exitcode is None:
+                process.terminate()
+        self.tables.unlink()
+
+    async def watch_workers(self):
+        """Restart each worker that has died, leaving the others alone"""
+        while True:
+            await asyncio.sleep(RESTART_DELAY)
+            for index, (process, channel) in enumerate(self.workers):
+                if process.exitcode is not None:
+                    print(f"Worker {index} exited with code {process.exitcode}; restarting")
+                    channel.close()
+                    self.start_worker(index)
+
+    def alive(self, index):
+        return self.workers[index][0].exitcode is None
+
+    def pick(self):
+        """A worker for a new game: the next live one, round robin"""
+        for _ in range(self.count):
+            index = self.next_worker
+            self.next_worker = (index + 1) % self.count
+            if self.alive(index):
+                return index
+        return None
+
+    def route(self, data):
+        """The worker for a client's answer to the session id prompt"""
+        try:
+            session = int(data.partition(b"\n")[0].strip(), 16)
+        except ValueError:
+            return self.pick()  # New game
+        return self.ring.node_for(session)
+
+    async def serve_forever(self):
+        """Accept connections and hand them to the workers until cancelled"""
+        loop = asyncio.get_running_loop()
+        listener = socket.create_server((self.args.host, self.args.port), backlog=1024)
+        listener.setblocking(False)
+        watcher = asyncio.ensure_future(self.watch_workers())
+        clients = set()  # The event loop only keeps weak references to tasks
+        try:
+            with listener:
+                while True:
+                    client, _ = await loop.sock_accept(listener)
+                    task = asyncio.ensure_future(self.handle_client(client))
+                    clients.add(task)
+                    task.add_done_callback(clients.discard)
+        finally:
+            watcher.cancel()
+
+    async def handle_client(self, client):
+        """Route one connection to its worker"""
+        try:
+            data = b""
+            if self.sessions:
+                await self.send(client, BANNER + SESSION_PROMPT)
+                data = await asyncio.wait_for(self.read_line(client), self.args.idle_timeout)
+                if data is None:
+                    return
+                index = self.route(data)
+            else:
+                index = self.pick()
+            if index is None or not self.hand_off(index, client, data):
+                await self.send(client, "Server busy, please try again later.\n")
+        except (ConnectionError, asyncio.TimeoutError):
+            pass
+        finally:
+            client.close()  # The worker holds its own descriptor
+
+    def hand_off(self, index, client, data):
+        """Send a client socket and its early input to a worker; returns
+        False if the worker can't take it"""
+        process, channel = self.workers[index]
+        if process.exitcode is not None:
+            return False
+        try:
+            socket.send_fds(channel, [data], [client.fileno()])
+        except OSError:
+            return False  # Worker gone or its queue full
+        return True
+
+    async def read_line(self, client):
+        """Read up to the end of the first line; returns all the data read,
+        which may run past it, or None if the client left first"""
+        loop = asyncio.get_running_loop()
+        data = b""
+        while b"\n" not in data:
+            chunk = await loop.sock_recv(client, MAX_LINE)
+            if not chunk:
+                return None
+            data += chunk
+            if len(data) > MAX_LINE and b"\n" not in data:
+                data = b"\n"  # Overlong: treat as blank, as the server does
+                break
+        return data[:HANDOFF_SIZE]
+
+    async def send(self, client, text):
+        """Write text to the client, translating newlines for telnet"""
+        loop = asyncio.get_running_loop()
+        await loop.sock_sendall(client, text.replace("\n", "\r\n").encode("ascii"))
+
+
+def main():
+    """Command line entry point"""
+    parser = build_parser()
+    parser.description = parser.description.replace("server", "cluster")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="worker processes (default: one per core)")
+    args = parser.parse_args()
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    supervisor = Supervisor(args, args.workers)
+    supervisor.start()
+    print(f"Listening on {args.host}:{args.port} with {args.workers} workers")
+    try:
+        asyncio.run(supervisor.serve_forever())
+    except KeyboardInterrupt:
+        print("\nShutting down.")
+    finally:
+        supervisor.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
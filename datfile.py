@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Loader for the original adventure.dat data file
+
+Parses sections 1-6 (long descriptions, short descriptions, travel table,
+vocabulary, object descriptions and messages) and keeps a compiled marshal
+cache next to the data file. The cache is keyed on the file's mtime and
+size, falling back to a content hash, and is rebuilt whenever the data
+file changes.
+"""
+
+import hashlib
+import marshal
+import os
+import sys
+
+
+DAT_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "adventure.dat")
+CACHE_SUFFIX = ".cache"
+CACHE_VERSION = 1
+
+# Section number -> table name
+SECTIONS = {
+    1: "long_descriptions",
+    2: "short_descriptions",
+    3: "travel_table",
+    4: "vocabulary",
+    5: "object_descriptions",
+    6: "messages",
+}
+
+
+def parse_dat(text):
+    """Parse the contents of a .dat file into a dict of tables"""
+    tables = {name: {} for name in SECTIONS.values()}
+    section = None
+
+    for line in text.splitlines():
+        fields = line.split("\t")
+        head = fields[0].strip()
+        if not head:
+            continue
+
+        # A lone number starts a section, -1 ends it, 0 ends the file
+        if len(fields) == 1:
+            number = int(head)
+            if number == 0:
+                break
+            section = None if number == -1 else number
+            continue
+        if head == "-1":
+            section = None
+            continue
+        if section is None:
+            continue
+
+        number = int(head)
+        if section == 3:
+            # Location, destination, then the motion words leading there;
+            # the first entry for a given motion wins, as in the original
+            codes = [int(field) for field in fields[1:] if field.strip()]
+            motions = tables["travel_table"].setdefault(number, {})
+            for motion in codes[1:]:
+                motions.setdefault(motion, codes[0])
+        elif section == 4:
+            tables["vocabulary"].setdefault(fields[1].strip(), number)
+        else:
+            text_line = fields[1][1:] if fields[1].startswith(" ") else fields[1]
+            if section == 1:
+                tables["long_descriptions"].setdefault(number, []).append(text_line)
+            elif section == 2:
+                tables["short_descriptions"][number] = text_line
+            elif section == 5:
+                # Hundreds digit is the object property, the rest the object
+                prop, obj = divmod(number, 100)
+                tables["object_descriptions"].setdefault(obj, {})[prop] = text_line
+            elif section == 6:
+                tables["messages"].setdefault(number, []).append(text_line)
+
+    return tables
+
+
+def cache_path_for(path):
+    """Return the compiled cache file name for a .dat file"""
+    return path + CACHE_SUFFIX
+
+
+def load(path=DAT_FILE, cache_path=None, check_hash=False):
+    """Load the tables from a .dat file, using the compiled cache if valid.
+
+    The cache is trusted when the data file's mtime and size match; with
+    check_hash the content hash is verified as well. A stale or missing
+    cache is rebuilt after parsing.
+    """
+    if cache_path is None:
+        cache_path = cache_path_for(path)
+
+    stat = os.stat(path)
+    cached = read_cache(cache_path)
+
+    if cached is not None:
+        mtime, size, digest, tables = cached
+        if mtime == stat.st_mtime_ns and size == stat.st_size and not check_hash:
+            return tables
+
+    with open(path, "rb") as f:
+        data = f.read()
+    new_digest = hashlib.sha1(data).hexdigest()
+
+    if cached is not None and digest == new_digest:
+        # Same contents under a new mtime (e.g. a fresh checkout)
+        if mtime != stat.st_mtime_ns or size != stat.st_size:
+            write_cache(cache_path, stat, new_digest, tables)
+        return tables
+
+    tables = parse_dat(data.decode("latin-1"))
+    write_cache(cache_path, stat, new_digest, tables)
+    return tables
+
+
+def read_cache(cache_path):
+    """Read a compiled cache; returns (mtime, size, digest, tables) or None"""
+    try:
+        with open(cache_path, "rb") as f:
+            version, mtime, size, digest, tables = marshal.load(f)
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+
+    if version != CACHE_VERSION:
+        return None
+    return mtime, size, digest, tables
+
+
+def write_cache(cache_path, stat, digest, tables):
+    """Write a compiled cache atomically; failures are silently ignored"""
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            marshal.dump((CACHE_VERSION, stat.st_mtime_ns, stat.st_size,
+                          digest, tables), f)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+
+def main():
+    """Compile a .dat file and report what it contains"""
+    path = sys.argv[1] if len(sys.argv) > 1 else DAT_FILE
+    tables = load(path)
+    print(f"Compiled {path} -> {cache_path_for(path)}")
+    for name in SECTIONS.values():
+        print(f"  {name}: {len(tables[name])} entries")
+
+
+if __name__ == "__main__":
+    main()
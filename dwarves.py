@@ -0,0 +1,144 @@
+"""
+Batched dwarf simulation for Colossal Cave Adventure
+
+DwarfBatch holds the dwarf state of many sessions as NumPy arrays and
+advances all of them with one vectorized call per turn. It follows
+Adventure.move_dwarves exactly, down to each session's random stream
+(SplitMix64, as in utils.GameRandom, run on uint64 arrays), so a session
+gets the same dwarves whether it is stepped alone or in a batch.
+
+It is an optional companion to the engine: without NumPy the module still
+imports, and only DwarfBatch (and so check_dwarves_batch) refuses to run,
+leaving each game to its own check_dwarves().
+"""
+
+from array import array
+
+try:
+    import numpy as np
+except ImportError:  # Optional; see DwarfBatch
+    np = None
+
+from game_data import dwarf_travel
+from utils import GameRandom
+
+
+class DwarfBatch:
+    def __init__(self, size, seeds=None):
+        """Dwarf state for size sessions, all before the dwarves start.
+
+        seeds gives each session's random stream (fresh ones are drawn if
+        None), as the seed argument of Adventure does.
+        """
+        if np is None:
+            raise ImportError("DwarfBatch needs NumPy (pip install numpy)")
+        self.size = size
+        self.stage = np.zeros(size, dtype=np.int32)
+        self.locations = np.zeros((size, 3), dtype=np.int16)
+        self.old_locations = np.zeros((size, 3), dtype=np.int16)
+        self.seen = np.zeros((size, 3), dtype=np.bool_)
+        if seeds is None:
+            seeds = [None] * size
+        self.rng = np.array([GameRandom(seed).getstate() for seed in seeds],
+                            dtype=np.uint64)
+        self.travel = np.array(dwarf_travel, dtype=np.int16)
+
+    @classmethod
+    def from_games(cls, games):
+        """Gather the dwarf state and random streams of Adventure games"""
+        batch = cls(len(games), [0] * len(games))
+        batch.stage[:] = [game.dwarf_stage for game in games]
+        batch.locations[:] = [game.dwarf_locations for game in games]
+        batch.old_locations[:] = [game.old_dwarf_locations for game in games]
+        batch.seen[:] = [list(game.dwarf_seen) for game in games]
+        batch.rng[:] = [game.rng.getstate() for game in games]
+        return batch
+
+    def to_games(self, games):
+        """Write the dwarf state and random streams back into the games"""
+        rows = zip(games, self.stage.tolist(), self.locations.tolist(),
+                   self.old_locations.tolist(), self.seen.tolist(), self.rng.tolist())
+        for game, stage, locations, old_locations, seen, state in rows:
+            game.dwarf_stage = stage
+            game.dwarf_locations[:] = array("h", locations)
+            game.old_dwarf_locations[:] = array("h", old_locations)
+            game.dwarf_seen[:] = bytes(seen)
+            game.rng.setstate(state)
+
+    def random(self, mask):
+        """Draw the next float from the random stream of each masked session"""
+        state = self.rng[mask] + np.uint64(GameRandom.GAMMA)
+        self.rng[mask] = state
+        z = (state ^ (state >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        z ^= z >> np.uint64(31)
+        return (z >> np.uint64(11)).astype(np.float64) * (1.0 / 9007199254740992.0)
+
+    def step(self, player_locations):
+        """Advance every session's dwarves one turn.
+
+        player_locations holds each session's location. Returns the arrays
+        (appeared, present, attacks, hits), per session as returned by
+        Adventure.move_dwarves.
+        """
+        location = np.asarray(player_locations, dtype=np.int16)
+        stage = self.stage
+        waiting = stage == 1
+        active = stage >= 2
+
+        # Start dwarves at location 15
+        stage[(stage == 0) & (location == 15)] = 1
+
+        # Initial delay
+        appeared = np.zeros(self.size, dtype=np.bool_)
+        appeared[waiting] = self.random(waiting) < 0.05
+        stage[appeared] = 2
+        self.locations[appeared] = 0
+        self.old_locations[appeared] = 0
+        self.seen[appeared] = False
+
+        # Move dwarves
+        stage[active] += 1
+        present = np.zeros(self.size, dtype=np.int8)
+        attacks = np.zeros(self.size, dtype=np.int8)
+        hits = np.zeros(self.size, dtype=np.int8)
+        deep = location > 14
+
+        for i in range(3):
+            locations = self.locations[:, i]
+            old_locations = self.old_locations[:, i]
+            seen = self.seen[:, i]
+            order = 2 * i + stage
+
+            moving = active & (order >= 8) & ~((order > 23) & ~seen)
+            old_locations[moving] = locations[moving]
+
+            index = order - 8
+            travel = moving & ~seen & deep & (index < len(self.travel))
+            locations[travel] = self.travel[index[travel]]
+
+            meet = moving & ((locations == location) | (old_locations == location))
+            seen[meet] = True
+            locations[meet] = location[meet]
+            present += meet
+
+            attack = meet & (old_locations == locations)
+            attacks += attack
+            hit = np.zeros(self.size, dtype=np.bool_)
+            hit[attack] = self.random(attack) < 0.1
+            hits += hit
+
+        return appeared, present, attacks, hits
+
+
+def check_dwarves_batch(games):
+    """Run check_dwarves for many games with one batched dwarf step.
+
+    Has the same effect as calling game.check_dwarves() on each game.
+    """
+    batch = DwarfBatch.from_games(games)
+    appeared, present, attacks, hits = batch.step([game.location for game in games])
+    batch.to_games(games)
+    for n in np.flatnonzero(appeared | (present > 0)).tolist():
+        games[n].dwarf_encounter(bool(appeared[n]), int(present[n]),
+                                 int(attacks[n]), int(hits[n]))
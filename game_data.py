@@ -16,6 +16,11 @@ FOOD = 19
 WATER = 20
 AXE = 21
 
+# Highest object number and number of location slots, used to size the
+# per-game state arrays
+MAX_OBJECT = 21
+LOCATION_SLOTS = 300
+
 # Initial object placements (location where object starts)
 initial_placements = {
     1: 3, 2: 3, 3: 8, 4: 10, 5: 11, 6: 14, 7: 13, 8: 9,
@@ -36,23 +41,62 @@ dwarf_travel = [
 # Question/response indices
 quip_responses = [50, 51, 64, 66, 67, 68, 69, 49, 79]
 
+# Yes/no questions: question message -> (yes message, no message)
+question_responses = {
+    65: (0, 0),     # Instructions
+    100: (0, 0),    # Quit
+    62: (63, 54),   # Help at the grate
+    18: (19, 54),   # Help with the bird
+    20: (21, 54),   # Help with the snake
+}
+
 # Verb-specific messages
 verb_messages = [24, 29, 0, 31, 0, 31, 38, 38, 42, 42, 43, 46, 77, 71, 73, 75]
 
-# Location conditions (1 = requires light, 2 = no question, 0 = has natural light)
-location_conditions = {}
-# Locations 1-10 have natural light (outside)
-for i in range(1, 11):
-    location_conditions[i] = 0  # Changed to 0 for natural light
+# ADVENTURE_TABLES names a shared memory segment holding the read-only
+# tables below (see sharedtables.py); a process attached to it uses them
+# instead of building its own copies, as cluster.py's workers do
+def _attach_shared_tables():
+    import os
+    name = os.environ.get("ADVENTURE_TABLES")
+    if not name:
+        return None
+
+    import sharedtables
+    return sharedtables.attach(name)
+
+
+_shared = _attach_shared_tables()
+
+
+# ADVENTURE_TEXT names a text store (see textstore.py) that replaces the
+# descriptions and messages below, so processes share one mapped copy of
+# the text
+def _open_text_store():
+    import os
+    path = os.environ.get("ADVENTURE_TEXT")
+    if not path or _shared:
+        return None
+
+    import textstore
+    return textstore.TextStore(path)
 
-# Dark locations that need lamp
-location_conditions.update({
+
+# Where the text tables come from, if not the literals below
+_text = _shared or _open_text_store()
+
+# Location conditions (1 = requires light, 2 = no question, 0 = has natural light)
+location_conditions = _shared.location_conditions if _shared else {
+    # Locations 1-10 have natural light (outside)
+    1: 0, 2: 0, 3: 0, 4: 0, 5: 0, 6: 0, 7: 0, 8: 0, 9: 0, 10: 0,
+    # Dark locations that need lamp
     16: 2, 20: 2, 21: 2, 22: 2, 23: 2, 24: 2,
-    25: 2, 26: 2, 31: 2, 32: 2, 79: 2
-})
+    25: 2, 26: 2, 31: 2, 32: 2, 79: 2,
+}
+
 
 # Game messages (these would normally be loaded from external file)
-messages = {
+messages = _text.messages if _text else {
     2: "There are threatening little dwarves in the room with you!",
     3: "There is a threatening little dwarf in the room with you!",
     4: "The dwarf throws a knife at you.",
@@ -125,7 +169,7 @@ messages = {
 }
 
 # Location descriptions (short form)
-short_descriptions = {
+short_descriptions = _text.short_descriptions if _text else {
     1: "You're at end of road again.",
     2: "You're at hill in road.",
     3: "You're inside building.",
@@ -156,7 +200,7 @@ short_descriptions = {
 }
 
 # Long location descriptions
-long_descriptions = {
+long_descriptions = _text.long_descriptions if _text else {
     1: ["You are standing at the end of a road before a small brick",
         "building. Around you is a forest. A small",
         "stream flows out of the building and down a gully."],
@@ -309,7 +353,7 @@ long_descriptions = {
 }
 
 # Object descriptions
-object_descriptions = {
+object_descriptions = _shared.object_descriptions if _shared else {
     KEYS: "There are some keys on the ground here.",
     LAMP: "There is a shiny brass lamp nearby.",
     GRATE: "The grate is locked.",
@@ -322,7 +366,7 @@ object_descriptions = {
 }
 
 # Vocabulary - words and their numeric codes
-vocabulary = {
+vocabulary = _shared.vocabulary if _shared else {
     # Motion verbs (type 0) - from adventure.dat lines 380-470
     'ROAD': 2,
     'ENTER': 3, 'DOOR': 3, 'GATE': 3,
@@ -420,11 +464,15 @@ vocabulary = {
     'POUR': (16, 2),
     'LIST': (17, 2), 'OPTIONS': (17, 2), 'COMMANDS': (17, 2),
     'LOCATION': (18, 2), 'WHERE': (18, 2),
+    'SAVE': (19, 2), 'SUSPEND': (19, 2),
+    'RESTORE': (20, 2), 'RESUME': (20, 2),
+    'GOTO': (21, 2),
+    'STATS': (22, 2),
 }
 
 # Travel table - format: {location: {motion_code: new_location}}
 # Complete travel table from adventure.dat
-travel_table = {
+travel_table = _shared.travel_table if _shared else {
     1: {2: 2, 44: 2, 3: 3, 12: 3, 19: 3, 43: 3, 4: 4, 5: 4, 13: 4, 14: 4, 46: 4, 30: 4, 6: 5, 45: 5, 8: 8, 49: 8},
     2: {8: 1, 2: 1, 12: 1, 7: 1, 43: 1, 45: 1, 30: 1, 6: 5, 46: 5},
     3: {3: 1, 11: 1, 32: 1, 44: 1, 48: 11, 65: 33, 5: 79, 14: 79},
@@ -504,3 +552,24 @@ travel_table = {
     78: {46: 77},
     79: {1: 3},
 }
+
+
+# Variant datasets: ADVENTURE_DAT names a .dat file whose cave layout and
+# room descriptions replace the built-in tables (compiled once, then cached)
+def _load_variant():
+    import os
+    path = os.environ.get("ADVENTURE_DAT")
+    if not path or _shared:
+        return  # The shared tables were exported with the variant applied
+
+    import datfile
+    tables = datfile.load(path)
+    globals()["travel_table"] = tables["travel_table"]
+    if not _text:  # A text store's descriptions take precedence
+        globals().update(
+            long_descriptions=tables["long_descriptions"],
+            short_descriptions=tables["short_descriptions"],
+        )
+
+
+_load_variant()
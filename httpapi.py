@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Stateless HTTP/JSON API for Colossal Cave Adventure
+
+The server keeps no games: each request carries the whole game as a
+token, the compact save() blob compressed and signed with HMAC-SHA256, and
+each response returns the output of one step with a new token. Any worker
+holding the secret can serve any request, so nodes need no sticky sessions.
+
+    POST /new   {"seed": 42}                     (seed optional)
+    POST /step  {"token": "...", "command": "take lamp"}
+    ->          {"output": "...", "game_over": false, "token": "..."}
+
+The token is the game's state, not a session: a client can replay an old
+token to undo moves, much as SAVE and RESTORE allow.
+
+    ADVENTURE_SECRET=... python httpapi.py --port 8080 --workers 4
+"""
+
+import argparse
+import base64
+import hashlib
+import hmac
+import json
+import multiprocessing
+import os
+import sys
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import savegame
+from adventure import Adventure
+from version import __version__
+
+
+TOKEN_VERSION = 1
+MAC_SIZE = 16  # Truncated HMAC-SHA256
+MAX_BODY = 4096
+
+
+class TokenError(ValueError):
+    """Raised for tokens that are malformed, forged or from another version"""
+
+
+def compress(data):
+    """Raw deflate, without the zlib header and checksum"""
+    compressor = zlib.compressobj(9, zlib.DEFLATED, -15)
+    return compressor.compress(data) + compressor.flush()
+
+
+def encode_token(game, key):
+    """Return a game's state as a signed, compressed URL-safe token"""
+    body = bytes([TOKEN_VERSION]) + compress(game.save())
+    mac = hmac.new(key, body, hashlib.sha256).digest()[:MAC_SIZE]
+    return base64.urlsafe_b64encode(mac + body).rstrip(b"=").decode("ascii")
+
+
+def decode_token(token, key):
+    """Verify a token and return the game it holds"""
+    try:
+        data = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+    except (ValueError, TypeError):
+        raise TokenError("malformed token")
+
+    mac, body = data[:MAC_SIZE], data[MAC_SIZE:]
+    expected = hmac.new(key, body, hashlib.sha256).digest()[:MAC_SIZE]
+    if not body or not hmac.compare_digest(mac, expected):
+        raise TokenError("bad token signature")
+    if body[0] != TOKEN_VERSION:
+        raise TokenError("unsupported token version")
+
+    try:
+        blob = zlib.decompressobj(-15).decompress(body[1:], savegame.HEADER.size + 4096)
+        game = Adventure()
+        game.restore(blob)
+    except (zlib.error, savegame.SaveError):
+        raise TokenError("token does not hold a game")
+    return game
+
+
+def new_game(request, key):
+    """POST /new: start a game"""
+    seed = request.get("seed")
+    if seed is not None and not isinstance(seed, int):
+        raise TokenError("seed must be an integer")
+    game = Adventure(seed=seed)
+    return respond(game, game.start(), key)
+
+
+def step_game(request, key):
+    """POST /step: run one command in the game held by a token"""
+    token = request.get("token")
+    command = request.get("command")
+    if not isinstance(token, str) or not isinstance(command, str):
+        raise TokenError("token and command must be strings")
+    game = decode_token(token, key)
+    if game.game_over:
+        raise TokenError("the game is over")
+    text, game_over = game.step(command)
+    return respond(game, text, key)
+
+
+def respond(game, text, key):
+    return {
+        "output": text,
+        "game_over": game.game_over,
+        "token": None if game.game_over else encode_token(game, key),
+    }
+
+
+ROUTES = {"/new": new_game, "/step": step_game}
+
+
+class APIHandler(BaseHTTPRequestHandler):
+    server_version = f"Adventure/{__version__}"
+    key = b""  # Set by make_server()
+
+    def do_POST(self):
+        route = ROUTES.get(self.path)
+        if route is None:
+            self.send_json(404, {"error": "not found"})
+            return
+
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            length = -1
+        if not 0 <= length <= MAX_BODY:
+            # The body is left unread, so the connection can't be reused
+            self.close_connection = True
+            if length < 0:
+                self.send_json(400, {"error": "invalid Content-Length"})
+            else:
+                self.send_json(413, {"error": "request too large"})
+            return
+        try:
+            request = json.loads(self.rfile.read(length) or b"{}")
+            if not isinstance(request, dict):
+                raise ValueError("request must be a JSON object")
+            self.send_json(200, route(request, self.key))
+        except TokenError as e:
+            self.send_json(400, {"error": str(e)})
+        except ValueError:
+            self.send_json(400, {"error": "invalid JSON"})
+
+    def send_json(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass  # One line per move is too noisy
+
+
+def make_server(host, port, key):
+    """Create an HTTP server answering with the given signing key"""
+    handler = type("Handler", (APIHandler,), {"key": key})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def main():
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(
+        description=f"Colossal Cave Adventure HTTP API v{__version__}")
+    parser.add_argument("--host", default="127.0.0.1", help="address to bind")
+    parser.add_argument("--port", type=int, default=8080, help="port to listen on")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="processes sharing the listening socket (needs fork)")
+    args = parser.parse_args()
+
+    secret = os.environ.get("ADVENTURE_SECRET")
+    if secret:
+        key = secret.encode()
+    else:
+        key = os.urandom(32)
+        print("ADVENTURE_SECRET is not set: using a random key, so tokens "
+              "won't work across restarts or nodes", file=sys.stderr)
+
+    server = make_server(args.host, args.port, key)
+    # The workers accept from one socket, standing in for a load balancer
+    workers = [multiprocessing.get_context("fork").Process(target=server.serve_forever)
+               for _ in range(args.workers - 1)]
+    for worker in workers:
+        worker.start()
+
+    print(f"Listening on {args.host}:{args.port} with {args.workers} workers")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nShutting down.")
+    finally:
+        for worker in workers:
+            worker.terminate()
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,260 @@
+"""
+Crash-safe command journal for hosted Colossal Cave Adventure games
+
+Every accepted command is appended to a journal, tagged with its session,
+together with periodic save() snapshots of each game. Appends are buffered
+and written with one fsync per group commit, so any number of sessions
+share each disk flush. After a crash, recover() loads each session's
+latest snapshot and replays only the commands journaled after it.
+
+The journal is a directory of numbered segment files of records:
+
+    crc32, payload length, kind, session id, payload
+
+A checkpoint starts a new segment holding a snapshot of every live game
+and deletes the older segments, so recovery time stays bounded by the
+snapshot interval rather than the age of the sessions.
+"""
+
+import asyncio
+import os
+import struct
+import zlib
+
+from adventure import Adventure
+
+
+SUFFIX = ".journal"
+
+# Record kinds
+COMMAND = b"C"
+SNAPSHOT = b"S"
+END = b"E"
+
+# A record is the crc32 of the rest of it, then this header and the payload
+CRC = struct.Struct("<I")
+HEADER = struct.Struct("<HcQ")  # Payload length, kind, session id
+
+
+def encode_record(kind, session, payload):
+    """Return one record as bytes"""
+    record = HEADER.pack(len(payload), kind, session) + payload
+    return CRC.pack(zlib.crc32(record)) + record
+
+
+def read_records(path):
+    """Yield (kind, session id, payload) from a segment file, stopping at
+    the first torn or corrupt record"""
+    with open(path, "rb") as f:
+        data = f.read()
+    offset = 0
+    while offset + CRC.size + HEADER.size <= len(data):
+        crc, = CRC.unpack_from(data, offset)
+        length, kind, session = HEADER.unpack_from(data, offset + CRC.size)
+        start = offset + CRC.size + HEADER.size
+        end = start + length
+        if end > len(data) or zlib.crc32(data[offset + CRC.size:end]) != crc:
+            return
+        yield kind, session, data[start:end]
+        offset = end
+
+
+class Journal:
+    def __init__(self, directory, commit_interval=0.005, segment_size=64 << 20):
+        """Open a journal directory, creating it if needed.
+
+        Commits wait up to commit_interval seconds to gather records from
+        other sessions; needs_checkpoint() turns true once the current
+        segment passes segment_size bytes.
+        """
+        self.directory = directory
+        self.commit_interval = commit_interval
+        self.segment_size = segment_size
+        os.makedirs(directory, exist_ok=True)
+
+        self.segments = sorted(name for name in os.listdir(directory)
+                               if name.endswith(SUFFIX))
+        self.file = None
+        self.written = 0
+        self.buffer = bytearray()
+        self.batch = None     # Future for the records in buffer
+        self.inflight = None  # Future for the records being written
+
+    def segment_path(self, name):
+        return os.path.join(self.directory, name)
+
+    def open_segment(self):
+        """Start writing to a new segment file"""
+        number = int(self.segments[-1][:-len(SUFFIX)]) + 1 if self.segments else 1
+        name = f"{number:08d}{SUFFIX}"
+        if self.file is not None:
+            self.file.close()
+        self.file = open(self.segment_path(name), "ab")
+        self.sync_directory()  # The new file's entry is durable before it's relied on
+        self.segments.append(name)
+        self.written = 0
+
+    def sync_directory(self):
+        """fsync the journal directory, making file creation durable"""
+        if os.name == "nt":
+            return  # Directories can't be opened for fsync there
+        fd = os.open(self.directory, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def add(self, kind, session, payload):
+        """Buffer one record"""
+        self.buffer += encode_record(kind, session, payload)
+
+    def append(self, session, command):
+        """Journal a command a session has carried out"""
+        self.add(COMMAND, session, command.encode("ascii", errors="ignore")[:0xFFFF])
+
+    def snapshot(self, session, game):
+        """Journal a snapshot of a session's game"""
+        self.add(SNAPSHOT, session, game.save())
+
+    def end(self, session):
+        """Journal that a session's game is over and needn't be recovered"""
+        self.add(END, session, b"")
+
+    def write(self, data):
+        """Write and fsync a block of records to the current segment"""
+        if self.file is None:
+            self.open_segment()
+        self.file.write(data)
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.written += len(data)
+
+    def flush(self):
+        """Write the buffered records now, blocking until they are on disk"""
+        if self.buffer:
+            data, self.buffer = self.buffer, bytearray()
+            self.write(data)
+
+    async def commit(self):
+        """Wait until every record buffered so far is on disk.
+
+        Commits from many sessions within commit_interval share one write
+        and fsync, run in a thread so the event loop keeps serving.
+        """
+        if not self.buffer:
+            if self.inflight is not None:
+                await asyncio.shield(self.inflight)
+            return
+        if self.batch is None:
+            self.batch = asyncio.get_running_loop().create_future()
+            asyncio.ensure_future(self.group_commit())
+        await asyncio.shield(self.batch)
+
+    async def group_commit(self):
+        """Write the current batch of records once it has gathered"""
+        await asyncio.sleep(self.commit_interval)
+        while self.inflight is not None:
+            await asyncio.shield(self.inflight)
+        if self.batch is None:
+            return  # Taken over by a checkpoint, or written by a later commit
+
+        done, self.batch = self.batch, None
+        data, self.buffer = self.buffer, bytearray()
+        self.inflight = done
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, self.write, data)
+        except Exception as e:
+            done.set_exception(e)
+        else:
+            done.set_result(None)
+        finally:
+            self.inflight = None
+
+    def needs_checkpoint(self):
+        return self.written >= self.segment_size
+
+    async def rotate(self, live_snapshots):
+        """Checkpoint from the event loop, writing in a thread.
+
+        live_snapshots returns {session id: save() blob} for the games to
+        snapshot. It is called on the event loop once no write is in
+        flight, so the snapshots cover every record buffered until then:
+        those records are dropped with the old segments, and their commits
+        complete when the snapshots are on disk. Later commits wait for the
+        checkpoint. Does nothing if another rotate() has checkpointed in
+        the meantime.
+        """
+        while self.inflight is not None:
+            await asyncio.shield(self.inflight)
+        if not self.needs_checkpoint():
+            return
+
+        loop = asyncio.get_running_loop()
+        snapshots = live_snapshots()
+        done, self.batch = self.batch, None
+        self.buffer = bytearray()
+        if done is None:
+            done = loop.create_future()
+        self.inflight = done
+        try:
+            await loop.run_in_executor(None, self.write_checkpoint, snapshots)
+        except Exception as e:
+            done.set_exception(e)
+            raise
+        else:
+            done.set_result(None)
+        finally:
+            self.inflight = None
+
+    def checkpoint(self, snapshots):
+        """Start a new segment from snapshots ({session id: save() blob}) of
+        every live game, blocking until done; for use outside the event loop"""
+        self.flush()
+        self.write_checkpoint(snapshots)
+
+    def write_checkpoint(self, snapshots):
+        """Write snapshots to a new segment and delete the older segments"""
+        old_segments = list(self.segments)
+        self.open_segment()
+        self.write(b"".join(encode_record(SNAPSHOT, session, blob)
+                            for session, blob in snapshots.items()))
+        for name in old_segments:
+            os.remove(self.segment_path(name))
+        self.segments = self.segments[len(old_segments):]
+
+    def recover(self):
+        """Rebuild the unfinished games from the journal; returns {session id: game}
+
+        Each game is restored from its latest snapshot, then the commands
+        journaled after it are replayed through the engine.
+        """
+        snapshots = {}
+        tails = {}
+        for name in self.segments:
+            for kind, session, payload in read_records(self.segment_path(name)):
+                if kind == SNAPSHOT:
+                    snapshots[session] = payload
+                    tails[session] = []
+                elif kind == COMMAND:
+                    if session in tails:
+                        tails[session].append(payload.decode("ascii"))
+                elif kind == END:
+                    snapshots.pop(session, None)
+                    tails.pop(session, None)
+
+        games = {}
+        for session, snapshot in snapshots.items():
+            game = Adventure()
+            game.restore(snapshot)
+            for command in tails[session]:
+                game.step(command)
+            if not game.game_over:
+                games[session] = game
+        return games
+
+    def close(self):
+        """Write anything buffered and close the current segment"""
+        self.flush()
+        if self.file is not None:
+            self.file.close()
+            self.file = None
@@ -0,0 +1,176 @@
+"""
+Per-turn instrumentation for Colossal Cave Adventure
+
+When a TurnMetrics is installed as Adventure.metrics, the engine reports
+the phase boundaries of each step to it (parsing, the command handler,
+dwarf moves, and the lighting check plus description rendering), and they
+are recorded in latency histograms per phase, per verb and per location.
+The STATS command prints a summary, and a JSON dump can be written
+periodically. With no collector installed, a step costs a few attribute
+checks.
+"""
+
+import json
+import os
+from time import perf_counter
+
+
+PHASES = ("parse", "handler", "dwarves", "render")
+
+# Bucket i counts samples under 2**i microseconds; the last one is open-ended
+BUCKETS = 24
+
+
+class Histogram:
+    """Log2-bucketed latency histogram"""
+    __slots__ = ('count', 'total', 'buckets')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.buckets = [0] * BUCKETS
+
+    def add(self, seconds):
+        """Record one sample"""
+        self.count += 1
+        self.total += seconds
+        self.buckets[min(int(seconds * 1e6).bit_length(), BUCKETS - 1)] += 1
+
+    def percentile(self, fraction):
+        """Upper bound of the bucket holding the given fraction, in microseconds"""
+        if not self.count:
+            return 0
+        rank = fraction * self.count
+        seen = 0
+        for i, count in enumerate(self.buckets):
+            seen += count
+            if seen >= rank:
+                return 1 << i
+        return 1 << (BUCKETS - 1)
+
+    def mean(self):
+        """Mean sample, in microseconds"""
+        return self.total / self.count * 1e6 if self.count else 0.0
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "mean_us": round(self.mean(), 3),
+            "p50_us": self.percentile(0.5),
+            "p99_us": self.percentile(0.99),
+            "buckets": self.buckets,
+        }
+
+
+def verb_key(word_type, code, word_type2, code2):
+    """Name the verb of a parsed command for the per-verb statistics"""
+    if word_type == 1 and word_type2 is not None:
+        # "LAMP LIGHT": the verb is the second word
+        word_type, code = word_type2, code2
+    if word_type == 0:
+        return f"motion:{code}"
+    if word_type == 2:
+        return f"action:{code}"
+    return "other"
+
+
+class TurnMetrics:
+    def __init__(self, dump_path=None, dump_interval=60.0):
+        """Initialize empty statistics
+
+        If dump_path is given, the statistics are written there as JSON at
+        most every dump_interval seconds, from whichever step is running.
+        """
+        self.steps = Histogram()
+        self.phases = {phase: Histogram() for phase in PHASES}
+        self.verbs = {}
+        self.locations = {}
+        self.sources = {}  # Name -> callable returning more stats for the dump
+        self.dump_path = dump_path
+        self.dump_interval = dump_interval
+        self.next_dump = perf_counter() + dump_interval
+        # The step being timed
+        self.started = 0.0
+        self.location = None
+        self.key = None
+
+    def begin(self, game):
+        """Called by Adventure.step as a step starts"""
+        self.started = perf_counter()
+        self.location = game.location
+        self.key = "empty" if game.pending_question is None else "answer"
+
+    def mark(self, phase=None, since=None):
+        """Called by the engine at the phase boundaries of a step: records
+        the time from since to now under phase, if given; returns now"""
+        now = perf_counter()
+        if phase is not None:
+            self.phases[phase].add(now - since)
+        return now
+
+    def parsed(self, command, since):
+        """Called by Adventure.handle_command with the parsed command;
+        records the parse phase and returns now"""
+        self.key = verb_key(*command)
+        return self.mark("parse", since)
+
+    def end(self):
+        """Called by Adventure.step as a step ends"""
+        now = perf_counter()
+        elapsed = now - self.started
+        self.steps.add(elapsed)
+        histogram = self.verbs.get(self.key)
+        if histogram is None:
+            histogram = self.verbs[self.key] = Histogram()
+        histogram.add(elapsed)
+        histogram = self.locations.get(self.location)
+        if histogram is None:
+            histogram = self.locations[self.location] = Histogram()
+        histogram.add(elapsed)
+
+        if self.dump_path is not None and now >= self.next_dump:
+            self.next_dump = now + self.dump_interval
+            self.dump(self.dump_path)
+
+    def to_dict(self):
+        """The statistics as JSON-ready dicts"""
+        data = {
+            "steps": self.steps.to_dict(),
+            "phases": {phase: h.to_dict() for phase, h in self.phases.items()},
+            "verbs": {key: h.to_dict() for key, h in sorted(self.verbs.items())},
+            "locations": {str(location): h.to_dict()
+                          for location, h in sorted(self.locations.items())},
+        }
+        for name, source in self.sources.items():
+            data[name] = source()
+        return data
+
+    def dump(self, path):
+        """Write the statistics to a JSON file, replacing it atomically"""
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(self.to_dict(), f, indent=1)
+        os.replace(temp_path, path)
+
+    def report(self, top=5):
+        """Return a short text summary for the STATS command"""
+        lines = [f"{self.steps.count} commands timed "
+                 f"(mean / p50 / p99 in microseconds):",
+                 self.format_row("all", self.steps)]
+        for phase, histogram in self.phases.items():
+            lines.append(self.format_row(phase, histogram))
+
+        for title, table in (("Slowest verbs:", self.verbs),
+                             ("Slowest locations:", self.locations)):
+            slowest = sorted(table.items(), key=lambda item: item[1].percentile(0.99),
+                             reverse=True)[:top]
+            if slowest:
+                lines.append(title)
+                lines.extend(self.format_row(key, histogram)
+                             for key, histogram in slowest)
+        return "\n".join(lines)
+
+    @staticmethod
+    def format_row(name, histogram):
+        return (f"  {str(name):14} {histogram.count:8} {histogram.mean():9.1f} "
+                f"{histogram.percentile(0.5):7} {histogram.percentile(0.99):7}")
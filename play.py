@@ -4,7 +4,7 @@ Quick start guide for Colossal Cave Adventure
 Demonstrates basic gameplay
 """
 
-from adventure import __version__
+from version import __version__
 
 print(f"""
 =================================================================
@@ -26,7 +26,8 @@ Actions:     LOOK (or L) - look around again
              EAT FOOD, DRINK WATER
              ATTACK [creature]
 
-Other:       QUIT - exit the game
+Other:       SAVE, RESTORE - save or resume your game
+             QUIT - exit the game
 
 
 GETTING STARTED:
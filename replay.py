@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Parallel transcript replay for Colossal Cave Adventure
+
+Replays a directory of command transcripts, each through a fresh headless
+Adventure with a fixed random seed, spread over a process pool. Reports the
+final state and an output digest per transcript, so runs can be saved and
+compared as a regression check.
+
+A transcript holds one command per line; a leading "> " prompt, blank lines
+and lines starting with "#" are ignored. Transcripts may omit the answer
+to the opening instructions question.
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+from adventure import Adventure
+
+
+def read_transcript(path):
+    """Return the commands in a transcript file"""
+    commands = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith(">"):
+                line = line[1:].strip()
+            if line and not line.startswith("#"):
+                commands.append(line)
+    return commands
+
+
+def replay(name, commands, seed=0):
+    """Replay commands through a fresh game and return a result dict"""
+    game = Adventure(seed=seed)
+    digest = hashlib.sha256()
+    started = time.perf_counter()
+
+    digest.update(game.start().encode())
+    if commands and commands[0].split()[0].upper() not in ("YES", "Y", "NO", "N"):
+        digest.update(game.step("NO")[0].encode())
+
+    played = 0
+    for command in commands:
+        if game.game_over:
+            break
+        text, _ = game.step(command)
+        digest.update(text.encode())
+        played += 1
+
+    elapsed = time.perf_counter() - started
+    return {
+        "name": name,
+        "commands": played,
+        "location": game.location,
+        "carried": list(game.objects_at(-1)),
+        "game_over": game.game_over,
+        "digest": digest.hexdigest(),
+        "seconds": elapsed,
+    }
+
+
+def replay_task(task):
+    """Pool worker: replay one (name, commands, seed) task"""
+    return replay(*task)
+
+
+def replay_all(paths, seed=0, jobs=None):
+    """Replay transcript files across a process pool; returns results by name"""
+    tasks = [(os.path.basename(path), read_transcript(path), seed) for path in paths]
+    if jobs == 1:
+        results = map(replay_task, tasks)
+        return sorted(results, key=lambda result: result["name"])
+
+    with multiprocessing.Pool(jobs) as pool:
+        chunksize = max(1, len(tasks) // ((jobs or os.cpu_count() or 1) * 4))
+        results = list(pool.imap_unordered(replay_task, tasks, chunksize))
+    return sorted(results, key=lambda result: result["name"])
+
+
+def compare(results, baseline):
+    """Return the names whose final state or output differs from a baseline"""
+    expected = {result["name"]: result for result in baseline}
+    changed = []
+    for result in results:
+        before = expected.get(result["name"])
+        if before is None:
+            continue
+        for key in ("commands", "location", "carried", "game_over", "digest"):
+            if before[key] != result[key]:
+                changed.append(result["name"])
+                break
+    return changed
+
+
+def main():
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description="Replay command transcripts in parallel")
+    parser.add_argument("directory", help="directory of transcript files")
+    parser.add_argument("--pattern", default="*.txt", help="transcript file pattern")
+    parser.add_argument("--seed", type=int, default=0, help="random seed for every game")
+    parser.add_argument("--jobs", type=int, default=None,
+                        help="worker processes (default: one per core)")
+    parser.add_argument("--json", metavar="FILE", help="write results as JSON")
+    parser.add_argument("--check", metavar="FILE",
+                        help="compare against results saved with --json")
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(os.path.join(args.directory, args.pattern)))
+    if not paths:
+        print(f"No transcripts matching {args.pattern} in {args.directory}")
+        return 1
+
+    started = time.perf_counter()
+    results = replay_all(paths, args.seed, args.jobs)
+    elapsed = time.perf_counter() - started
+
+    for result in results:
+        status = "over" if result["game_over"] else "live"
+        rate = result["commands"] / result["seconds"] if result["seconds"] else 0
+        print(f"{result['name']:30} {result['commands']:6} cmds {rate:9.0f}/s  "
+              f"loc {result['location']:3}  {status}  {result['digest'][:16]}")
+
+    total = sum(result["commands"] for result in results)
+    print(f"\n{len(results)} transcripts, {total} commands in {elapsed:.2f}s "
+          f"({total / elapsed:.0f} commands/s)")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=1)
+
+    if args.check:
+        with open(args.check) as f:
+            changed = compare(results, json.load(f))
+        if changed:
+            print(f"\n{len(changed)} transcripts differ from {args.check}:")
+            for name in changed:
+                print(f"  {name}")
+            return 1
+        print(f"All transcripts match {args.check}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,176 @@
+"""
+Shortest-path routing over the travel table for Colossal Cave Adventure
+
+Runs a breadth-first search from every location once and keeps compact
+distance / next-hop matrices, one set for each grate state, so routes and
+hints are answered by following next hops instead of searching the graph.
+"""
+
+from array import array
+
+from game_data import travel_table, short_descriptions
+from utils import MAGIC_MOTIONS
+
+
+UNREACHABLE = 0xFFFF
+
+# Motions never used for routing: QUIT shares code 17 with CRAWL, and the
+# magic words are left for the player to discover
+EXCLUDED_MOTIONS = MAGIC_MOTIONS | {17}
+
+# Words that don't help name a room
+NAME_STOPWORDS = {"you're", "in", "at", "on", "of", "the", "to", "n", "again"}
+
+
+def forced_moves(travel_table):
+    """Locations whose only exit is motion 1, taken at once: error messages
+    that bounce the player back, and passages like the sewer pipes. A route
+    can neither pass through nor end at one."""
+    return {location for location, motions in travel_table.items()
+            if set(motions) == {1}}
+
+
+def resolve_destination(destination, grate_open):
+    """Resolve a travel table destination as Adventure.handle_special_location
+    does; returns None for random or no-op destinations"""
+    if destination < 300:
+        return destination
+    if destination == 301:  # Grate check going down
+        return 9 if grate_open else 23
+    if destination == 302:  # Grate check going up
+        return 8 if grate_open else 25
+    if destination == 303:  # Pit check
+        return 15 if grate_open else 14
+    return None  # 300 is a random fork, others leave the player in place
+
+
+class RoutingIndex:
+    def __init__(self, travel_table):
+        """Build the all-pairs routing matrices for a travel table"""
+        locations = set(travel_table)
+        for motions in travel_table.values():
+            locations.update(dest for dest in motions.values() if dest < 300)
+        self.size = max(locations) + 1
+        self.forced = forced_moves(travel_table)
+
+        # grate open -> (distance, next motion, next location), each a
+        # size x size matrix indexed by source * size + target
+        self.tables = {}
+        for grate_open in (False, True):
+            graph = self.build_graph(travel_table, grate_open)
+            self.tables[grate_open] = self.search_all(graph)
+
+    def build_graph(self, travel_table, grate_open):
+        """Return {location: [(motion, next location)]} for routable moves"""
+        graph = {}
+        for location, motions in travel_table.items():
+            edges = []
+            seen = set()
+            for motion in sorted(motions):
+                if motion in EXCLUDED_MOTIONS or motion == 1:
+                    continue
+                destination = resolve_destination(motions[motion], grate_open)
+                if destination is None or destination == location or \
+                   destination in self.forced or destination in seen:
+                    continue
+                seen.add(destination)
+                edges.append((motion, destination))
+            graph[location] = edges
+        return graph
+
+    def search_all(self, graph):
+        """Breadth-first search from every location"""
+        size = self.size
+        distance = array("H", [UNREACHABLE]) * (size * size)
+        next_motion = array("H", [0]) * (size * size)
+        next_location = array("H", [0]) * (size * size)
+
+        for source in graph:
+            row = source * size
+            distance[row + source] = 0
+            frontier = []
+            # First hops fix the next move for everything reached through them
+            for motion, destination in graph[source]:
+                if distance[row + destination] == UNREACHABLE:
+                    distance[row + destination] = 1
+                    next_motion[row + destination] = motion
+                    next_location[row + destination] = destination
+                    frontier.append(destination)
+
+            depth = 1
+            while frontier:
+                depth += 1
+                reached = []
+                for location in frontier:
+                    first_motion = next_motion[row + location]
+                    first_location = next_location[row + location]
+                    for _, destination in graph.get(location, ()):
+                        if distance[row + destination] == UNREACHABLE:
+                            distance[row + destination] = depth
+                            next_motion[row + destination] = first_motion
+                            next_location[row + destination] = first_location
+                            reached.append(destination)
+                frontier = reached
+
+        return distance, next_motion, next_location
+
+    def distance(self, source, target, grate_open):
+        """Number of moves from source to target, or None if unreachable"""
+        if source >= self.size or target >= self.size:
+            return None
+        distance = self.tables[grate_open][0][source * self.size + target]
+        return None if distance == UNREACHABLE else distance
+
+    def next_move(self, source, target, grate_open):
+        """Return (motion, location) for the first move towards target"""
+        if not self.distance(source, target, grate_open):
+            return None
+        _, next_motion, next_location = self.tables[grate_open]
+        index = source * self.size + target
+        return next_motion[index], next_location[index]
+
+    def route(self, source, target, grate_open):
+        """Return the list of (motion, location) moves from source to target"""
+        moves = []
+        while source != target:
+            move = self.next_move(source, target, grate_open)
+            if move is None:
+                return None
+            moves.append(move)
+            source = move[1]
+        return moves
+
+
+def index_room_names(short_descriptions):
+    """Map each naming word of the short descriptions to its locations"""
+    names = {}
+    for location, description in short_descriptions.items():
+        for word in description.lower().rstrip(".").split():
+            if word not in NAME_STOPWORDS:
+                names.setdefault(word.upper(), []).append(location)
+    return names
+
+
+_index = None
+_room_names = None
+
+
+def get_index():
+    """Return the routing index for the game's travel table, built on first use"""
+    global _index
+    if _index is None:
+        _index = RoutingIndex(travel_table)
+    return _index
+
+
+def find_rooms(word):
+    """Return the locations whose short description has a word starting with word"""
+    global _room_names
+    if _room_names is None:
+        _room_names = index_room_names(short_descriptions)
+    if word.isdigit():
+        return [int(word)]
+    if len(word) < 2:
+        return []
+    return sorted({location for name, locations in _room_names.items()
+                   if name.startswith(word) for location in locations})
@@ -0,0 +1,129 @@
+"""
+Compact binary save format for Colossal Cave Adventure
+
+A saved game is a versioned, little-endian struct header followed by the
+object places, object properties and location visit counts. A typical
+game packs into under 200 bytes, and loading is a handful of struct and
+array calls, with no pickle involved.
+"""
+
+import struct
+import sys
+from array import array
+
+from game_data import LOCATION_SLOTS, question_responses
+
+
+MAGIC = b"CCAS"
+VERSION = 1
+
+# Flag bits
+LAMP_ON = 1
+FIRST_TIME = 2
+GRATE_LOCKED = 4
+GAME_OVER = 8
+
+# magic, version, flags, location, old location, dwarf stage, west count,
+# detail count, trouble count, pending question (0 = none), random state,
+# dwarf locations, old dwarf locations, dwarf seen bits, object count,
+# visit-count length
+HEADER = struct.Struct("<4sBBHHIIIBHQ3h3hBBH")
+
+
+class SaveError(ValueError):
+    """Raised when a blob is not a saved game this version can load"""
+
+
+def to_little_endian(values):
+    """Return the bytes of an array in little-endian order"""
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def pack(game):
+    """Return the state of a game as a compact binary blob"""
+    flags = ((LAMP_ON if game.lamp_on else 0)
+             | (FIRST_TIME if game.first_time else 0)
+             | (GRATE_LOCKED if game.grate_locked else 0)
+             | (GAME_OVER if game.game_over else 0))
+    seen = 0
+    for i, dwarf_seen in enumerate(game.dwarf_seen):
+        if dwarf_seen:
+            seen |= 1 << i
+
+    # Trailing unvisited locations are not stored
+    abbrev = bytes(game.location_abbrev).rstrip(b"\0")
+
+    header = HEADER.pack(
+        MAGIC, VERSION, flags, game.location, game.old_location,
+        game.dwarf_stage, game.west_count, game.detail_count,
+        game.trouble_count, game.pending_question or 0, game.rng.getstate(),
+        *game.dwarf_locations, *game.old_dwarf_locations, seen,
+        len(game.object_place), len(abbrev))
+    return b"".join((header, to_little_endian(game.object_place),
+                     bytes(game.object_props), abbrev))
+
+
+def unpack(game, data):
+    """Load a blob made by pack() into a game's state attributes.
+
+    Replaces the object, visit-count, dwarf and flag state; the caller
+    rebuilds anything derived from it, such as the object index. The blob
+    is checked in full first, so on SaveError the game is left unchanged.
+    """
+    if len(data) < HEADER.size or data[:4] != MAGIC:
+        raise SaveError("not a saved game")
+    (magic, version, flags, location, old_location, dwarf_stage, west_count,
+     detail_count, trouble_count, pending_question, rng_state,
+     d0, d1, d2, o0, o1, o2, seen, object_count, abbrev_length) = HEADER.unpack_from(data)
+    if version != VERSION:
+        raise SaveError(f"unsupported save version {version}")
+
+    offset = HEADER.size
+    end = offset + 2 * object_count + object_count + abbrev_length
+    if len(data) != end or object_count != len(game.object_place) or \
+       abbrev_length > len(game.location_abbrev):
+        raise SaveError("saved game does not match this game's data")
+
+    object_place = array("h")
+    object_place.frombytes(data[offset:offset + 2 * object_count])
+    if sys.byteorder == "big":
+        object_place.byteswap()
+    offset += 2 * object_count
+    object_props = bytearray(data[offset:offset + object_count])
+    offset += object_count
+    abbrev = data[offset:end]
+
+    # Everything used as an index must fit the tables: -1 is carried and
+    # 0 nowhere, for objects and dwarves
+    if not (0 < location < LOCATION_SLOTS and 0 < old_location < LOCATION_SLOTS):
+        raise SaveError("saved game has an invalid location")
+    if not all(-1 <= place < LOCATION_SLOTS for place in object_place):
+        raise SaveError("saved game has an invalid object place")
+    if not all(0 <= place < LOCATION_SLOTS for place in (d0, d1, d2, o0, o1, o2)):
+        raise SaveError("saved game has an invalid dwarf location")
+    if pending_question and pending_question not in question_responses:
+        raise SaveError("saved game has an invalid pending question")
+
+    game.object_place = object_place
+    game.object_props = object_props
+    game.location_abbrev[:abbrev_length] = abbrev
+    game.location_abbrev[abbrev_length:] = bytes(len(game.location_abbrev) - abbrev_length)
+
+    game.location = location
+    game.old_location = old_location
+    game.lamp_on = bool(flags & LAMP_ON)
+    game.first_time = bool(flags & FIRST_TIME)
+    game.grate_locked = bool(flags & GRATE_LOCKED)
+    game.game_over = bool(flags & GAME_OVER)
+    game.dwarf_stage = dwarf_stage
+    game.dwarf_locations = array("h", (d0, d1, d2))
+    game.old_dwarf_locations = array("h", (o0, o1, o2))
+    game.dwarf_seen = bytearray((seen >> i) & 1 for i in range(3))
+    game.west_count = west_count
+    game.detail_count = detail_count
+    game.trouble_count = trouble_count
+    game.pending_question = pending_question or None
+    game.rng.setstate(rng_state)
@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""
+Multi-session game server for Colossal Cave Adventure
+
+Hosts many Adventure sessions in a single asyncio event loop over a plain
+TCP line protocol (usable with telnet or nc). Each connection gets its own
+game; commands run through the headless Adventure.step() API, so no thread
+or process is tied up per player.
+
+With a session store or a journal, players get a session id on connecting
+and can give it again later to carry on. The store keeps a bounded number
+of games in memory and spills the rest to disk; the journal makes every
+command durable before it is answered, so games survive a crash.
+"""
+
+import argparse
+import asyncio
+import os
+
+from adventure import Adventure
+from journal import Journal
+from sessions import SessionStore
+from metrics import TurnMetrics
+from version import __version__
+
+
+BANNER = (
+    "=" * 60 + "\n"
+    "    COLOSSAL CAVE ADVENTURE\n"
+    + "=" * 60 + "\n\n"
+)
+PROMPT = "> "
+SESSION_PROMPT = "Session id to resume (blank for a new game): "
+MAX_LINE = 256  # Longest command line accepted from a client
+MAX_SESSION_ID = 1 << 63  # Session ids are below this, to fit sqlite
+
+
+class GameServer:
+    def __init__(self, host="127.0.0.1", port=4000, max_sessions=10000,
+                 idle_timeout=None, journal=None, snapshot_every=50, store=None,
+                 owns=None):
+        """Initialize server settings
+
+        journal is a journal.Journal to make games crash-safe, in which
+        case each game is snapshotted every snapshot_every commands.
+        store is a sessions.SessionStore holding resumable games (an
+        in-memory one is used if there is a journal but no store).
+        owns tells whether a session id belongs to this server, for a
+        shard of a cluster; new session ids are drawn until it does.
+        """
+        self.host = host
+        self.port = port
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.sessions = 0
+        self.server = None
+        self.journal = journal
+        self.snapshot_every = snapshot_every
+        if store is None and journal is not None:
+            store = SessionStore()
+        self.store = store
+        self.owns = owns
+        self.connected = set()  # Session ids with a player
+        self.evictor = None  # Task spilling idle games
+
+    async def start(self):
+        """Start listening for connections"""
+        self.server = await asyncio.start_server(
+            self.handle_client, self.host, self.port,
+            limit=MAX_LINE, backlog=1024)
+        return self.server
+
+    async def serve_forever(self):
+        """Start the server and run until cancelled"""
+        server = await self.start()
+        self.start_evictor()
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.stop_evictor()
+
+    def start_evictor(self):
+        """Start spilling idle games and expiring old ones in the background,
+        if the store does"""
+        if self.store is not None and (self.store.idle_timeout or self.store.expire_after):
+            self.evictor = asyncio.ensure_future(self.evict_idle_games())
+
+    def stop_evictor(self):
+        """Cancel the task started by start_evictor()"""
+        if self.evictor is not None and not self.evictor.done():
+            self.evictor.cancel()
+        self.evictor = None
+
+    async def evict_idle_games(self):
+        """Spill idle games to disk and expire old ones, periodically"""
+        interval = min(60.0, (self.store.idle_timeout or 120.0) / 2)
+        while True:
+            await asyncio.sleep(interval)
+            self.store.evict_idle()
+
+    async def handle_client(self, reader, writer, session_line=None):
+        """Run one game session for a connected client
+
+        session_line is the client's answer to the session id prompt, if
+        it was already asked (by a cluster front end) before the handoff.
+        """
+        if self.sessions >= self.max_sessions:
+            writer.write(b"Server full, please try again later.\n")
+            await self.close(writer)
+            return
+
+        self.sessions += 1
+        try:
+            if self.store is None:
+                game = Adventure()
+                await self.send(writer, BANNER + game.start() + PROMPT)
+                await self.play(game, reader, writer)
+            else:
+                await self.play_session(reader, writer, session_line)
+        except (ConnectionError, asyncio.TimeoutError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.sessions -= 1
+            await self.close(writer)
+
+    async def play_session(self, reader, writer, line=None):
+        """Start or resume a game kept in the session store, then play it"""
+        if line is None:
+            await self.send(writer, BANNER + SESSION_PROMPT)
+            line = await self.read_line(reader)
+            if line is None:
+                return
+
+        try:
+            session = int(line.strip(), 16)
+        except ValueError:
+            session = None
+        if session is not None and not 0 <= session < MAX_SESSION_ID:
+            session = None  # Not one we could have given out
+        game = None
+        if session is not None and session not in self.connected:
+            game = self.store.get(session)
+        if game is not None:
+            greeting = "Welcome back.\n\n"
+        else:
+            greeting = "No such game; starting a new one.\n\n" if line.strip() else ""
+            session = self.new_session_id()
+            game = Adventure()
+            greeting += f"Your session id is {session:016x}.\n\n{game.start()}"
+            self.store.put(session, game)
+            if self.journal is not None:
+                self.journal.snapshot(session, game)
+
+        self.connected.add(session)
+        try:
+            if self.journal is not None:
+                await self.journal.commit()
+            await self.send(writer, greeting + PROMPT)
+            await self.play(game, reader, writer, session)
+        finally:
+            self.connected.discard(session)
+
+    def new_session_id(self):
+        """Draw an unused session id, one this server owns if sharded"""
+        while True:
+            session = int.from_bytes(os.urandom(8), "little") % MAX_SESSION_ID
+            if self.owns is None or self.owns(session):
+                return session
+
+    async def play(self, game, reader, writer, session=None):
+        """Feed client lines to the game until it ends or the client leaves
+
+        With a session id, the game is looked up in the store for each
+        command, since it may have been spilled to disk meanwhile, and each
+        command is journaled (if journaling) before it is answered.
+        """
+        commands = 0
+        while True:
+            line = await self.read_line(reader)
+            if line is None:
+                return
+
+            if session is not None:
+                game = self.store.get(session)
+            text, game_over = game.step(line)
+            if session is not None:
+                commands += 1
+                if game_over:
+                    self.store.remove(session)
+                if self.journal is not None:
+                    await self.journal_command(session, game, line.strip(), commands)
+            if game_over:
+                await self.send(writer, text)
+                return
+            await self.send(writer, text + PROMPT)
+
+    async def journal_command(self, session, game, line, commands):
+        """Journal a command a game has just run and wait until it is durable"""
+        journal = self.journal
+        journal.append(session, line)
+        if game.game_over:
+            journal.end(session)
+        elif commands % self.snapshot_every == 0:
+            journal.snapshot(session, game)
+        await journal.commit()
+
+        if journal.needs_checkpoint():
+            await journal.rotate(self.store.snapshots)
+
+    async def read_line(self, reader):
+        """Read one command line; returns None when the client is gone"""
+        try:
+            if self.idle_timeout:
+                data = await asyncio.wait_for(reader.readline(), self.idle_timeout)
+            else:
+                data = await reader.readline()
+        except ValueError:
+            # Line longer than MAX_LINE: the reader has dropped it, treat as blank
+            return ""
+
+        if not data:
+            return None
+        return data.decode("ascii", errors="ignore")
+
+    async def send(self, writer, text):
+        """Write text to the client, translating newlines for telnet"""
+        writer.write(text.replace("\n", "\r\n").encode("ascii", errors="replace"))
+        await writer.drain()
+
+    async def close(self, writer):
+        """Close a client connection, ignoring errors from dead sockets"""
+        try:
+            writer.close()
+            await writer.wait_closed()
+        except ConnectionError:
+            pass
+
+    def shutdown(self):
+        """Write out the journal and the session store"""
+        self.stop_evictor()
+        if self.journal is not None:
+            self.journal.close()
+        if self.store is not None:
+            self.store.close()
+
+
+def build_parser():
+    """Command line options, shared with cluster.py"""
+    parser = argparse.ArgumentParser(
+        description=f"Colossal Cave Adventure server v{__version__}")
+    parser.add_argument("--host", default="127.0.0.1", help="address to bind")
+    parser.add_argument("--port", type=int, default=4000, help="port to listen on")
+    parser.add_argument("--max-sessions", type=int, default=10000,
+                        help="maximum number of concurrent games")
+    parser.add_argument("--idle-timeout", type=float, default=None,
+                        help="disconnect players idle for this many seconds")
+    parser.add_argument("--metrics", metavar="FILE",
+                        help="time every turn and dump the statistics to FILE as JSON")
+    parser.add_argument("--metrics-interval", type=float, default=60.0,
+                        help="seconds between metrics dumps (default: 60)")
+    parser.add_argument("--journal", metavar="DIR",
+                        help="journal games in DIR and recover them on restart")
+    parser.add_argument("--snapshot-every", type=int, default=50,
+                        help="commands between snapshots of a journaled game")
+    parser.add_argument("--store", metavar="FILE",
+                        help="keep resumable games, spilling idle ones to this sqlite file")
+    parser.add_argument("--store-capacity", type=int, default=10000,
+                        help="games kept in memory by the store (default: 10000)")
+    parser.add_argument("--store-idle", type=float, default=300.0,
+                        help="seconds before an idle game is spilled (default: 300)")
+    parser.add_argument("--store-expire", type=float, default=7 * 86400.0,
+                        help="seconds before a spilled game is deleted (default: a week)")
+    return parser
+
+
+def create_server(args, owns=None):
+    """Build a GameServer from command line options, recovering any
+    journaled games and enabling metrics"""
+    journal = None
+    if args.journal:
+        journal = Journal(args.journal)
+    store = None
+    if args.store:
+        store = SessionStore(args.store, args.store_capacity, args.store_idle,
+                             args.store_expire)
+
+    server = GameServer(args.host, args.port, args.max_sessions, args.idle_timeout,
+                        journal, args.snapshot_every, store, owns)
+    if journal is not None:
+        recovered = journal.recover()
+        for session, game in recovered.items():
+            server.store.put(session, game)
+        journal.checkpoint(server.store.snapshots())
+        print(f"Recovered {len(recovered)} games from {args.journal}")
+
+    # Enabled after recovery, so replayed commands aren't timed
+    if args.metrics:
+        Adventure.metrics = TurnMetrics(args.metrics, args.metrics_interval)
+        if server.store is not None:
+            Adventure.metrics.sources["sessions"] = server.store.stats
+    return server
+
+
+def main():
+    """Command line entry point"""
+    args = build_parser().parse_args()
+    server = create_server(args)
+
+    print(f"Listening on {args.host}:{args.port}")
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        print("\nShutting down.")
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+Session store for Colossal Cave Adventure servers
+
+Keeps a bounded working set of games in memory, most recently used last.
+Games pushed out by the capacity limit, or idle for longer than the idle
+timeout, are spilled to a sqlite database as save() blobs, and
+transparently rehydrated the next time their session is asked for, when
+their row is deleted. Rows left unclaimed for longer than the expiry time
+are deleted. Hit rate and rehydration latency are tracked for the
+server's metrics.
+
+Without a database path the store keeps every game in memory.
+"""
+
+import sqlite3
+import time
+from collections import OrderedDict
+from itertools import islice
+
+from adventure import Adventure
+from metrics import Histogram
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY,  -- Session id, below 2**63
+    state BLOB NOT NULL,     -- Adventure.save()
+    saved REAL NOT NULL      -- time.time() when spilled
+);
+CREATE INDEX IF NOT EXISTS sessions_saved ON sessions (saved);
+"""
+
+
+class SessionStore:
+    def __init__(self, path=None, capacity=None, idle_timeout=None, expire_after=None):
+        """Open a store spilling to the sqlite database at path.
+
+        At most capacity games stay in memory; idle_timeout is the number
+        of seconds after which evict_idle() spills a game, and
+        expire_after the number after which it deletes a spilled one.
+        They only apply with a database.
+        """
+        self.capacity = capacity if path is not None else None
+        self.idle_timeout = idle_timeout if path is not None else None
+        self.expire_after = expire_after if path is not None else None
+        self.resident = OrderedDict()  # Session id -> [game, last used]
+
+        self.db = None
+        if path is not None:
+            self.db = sqlite3.connect(path)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("PRAGMA synchronous=NORMAL")
+            self.db.executescript(SCHEMA)
+
+        self.hits = 0
+        self.misses = 0
+        self.spills = 0
+        self.rehydrate_time = Histogram()
+
+    def get(self, session):
+        """Return a session's game, loading it from disk if spilled; None if
+        there is no such session"""
+        entry = self.resident.get(session)
+        if entry is not None:
+            self.hits += 1
+            entry[1] = time.monotonic()
+            self.resident.move_to_end(session)
+            return entry[0]
+
+        self.misses += 1
+        if self.db is None:
+            return None
+        started = time.perf_counter()
+        row = self.db.execute("SELECT state FROM sessions WHERE id = ?",
+                              (session,)).fetchone()
+        if row is None:
+            return None
+        game = Adventure()
+        game.restore(row[0])
+        with self.db:
+            # Resident from now on: the game is written out again when spilled
+            self.db.execute("DELETE FROM sessions WHERE id = ?", (session,))
+        self.rehydrate_time.add(time.perf_counter() - started)
+        self.put(session, game)
+        return game
+
+    def put(self, session, game):
+        """Add or replace a session's game, spilling the least recently used
+        games if over capacity"""
+        self.resident[session] = [game, time.monotonic()]
+        self.resident.move_to_end(session)
+        if self.capacity is not None and len(self.resident) > self.capacity:
+            self.spill(list(islice(self.resident, len(self.resident) - self.capacity)))
+
+    def remove(self, session):
+        """Forget a session, in memory and on disk"""
+        self.resident.pop(session, None)
+        if self.db is not None:
+            with self.db:
+                self.db.execute("DELETE FROM sessions WHERE id = ?", (session,))
+
+    def spill(self, sessions):
+        """Write games to disk and drop them from memory, once written; if
+        that fails, every game stays in memory"""
+        now = time.time()
+        rows = [(session, self.resident[session][0].save(), now)
+                for session in sessions]
+        with self.db:
+            self.db.executemany("INSERT OR REPLACE INTO sessions VALUES (?, ?, ?)", rows)
+        for session in sessions:
+            del self.resident[session]
+        self.spills += len(rows)
+
+    def evict_idle(self):
+        """Spill the games idle for longer than the idle timeout, and delete
+        those spilled for longer than the expiry time; returns how many
+        were spilled"""
+        if self.expire_after is not None:
+            with self.db:
+                self.db.execute("DELETE FROM sessions WHERE saved < ?",
+                                (time.time() - self.expire_after,))
+        if self.idle_timeout is None:
+            return 0
+        cutoff = time.monotonic() - self.idle_timeout
+        idle = []
+        for session, (game, last_used) in self.resident.items():
+            if last_used > cutoff:
+                break  # The rest were used more recently
+            idle.append(session)
+        if idle:
+            self.spill(idle)
+        return len(idle)
+
+    def snapshots(self):
+        """Return {session id: save() blob} for every session, reading
+        spilled games as stored rather than loading them"""
+        snapshots = {session: entry[0].save() for session, entry in self.resident.items()}
+        if self.db is not None:
+            for session, state in self.db.execute("SELECT id, state FROM sessions"):
+                snapshots.setdefault(session, state)
+        return snapshots
+
+    def stats(self):
+        """Counters for the metrics dump"""
+        lookups = self.hits + self.misses
+        stored = 0
+        if self.db is not None:
+            stored = self.db.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+        return {
+            "resident": len(self.resident),
+            "stored": stored,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "spills": self.spills,
+            "rehydrate": self.rehydrate_time.to_dict(),
+        }
+
+    def close(self):
+        """Spill every game and close the database"""
+        if self.db is not None:
+            self.spill(list(self.resident))
+            self.db.close()
+            self.db = None
@@ -0,0 +1,332 @@
+"""
+Shared-memory game tables for Colossal Cave Adventure
+
+export() packs the read-only tables of game_data (travel table,
+vocabulary, light conditions, descriptions and messages) into one
+multiprocessing.shared_memory segment. attach() maps them in another
+process as read-only mappings over the segment, so any number of worker
+processes share a single copy instead of each building its own dicts.
+game_data attaches by itself when ADVENTURE_TABLES names a segment, as
+cluster.py arranges for its workers.
+
+The segment is a directory followed by flat arrays, in native byte order
+since it never leaves the machine:
+
+    text                 textstore.py image of the text tables
+    travel_rows          start of each location's exits in the next two
+    travel_motions       motion code of each exit
+    travel_destinations  where each exit leads
+    word_offsets         start of each word in word_text
+    word_text            the vocabulary words, end to end
+    word_slots           hash table of word numbers (crc32, linear probing)
+    word_codes           code of each word
+    word_types           type of each word, NONE for motion verbs
+    location_conditions  condition of each location, NONE if it has none
+"""
+
+import struct
+import zlib
+from array import array
+from collections.abc import Mapping
+from multiprocessing import resource_tracker, shared_memory
+
+import textstore
+
+
+ENV = "ADVENTURE_TABLES"
+MAGIC = b"CCSH"
+VERSION = 1
+
+TEXT_TABLES = textstore.TABLES + ("object_descriptions",)
+TABLES = TEXT_TABLES + ("travel_table", "vocabulary", "location_conditions")
+
+# Arrays in the segment, in order, with their typecodes
+ARRAYS = (
+    ("text", "B"),
+    ("travel_rows", "I"),
+    ("travel_motions", "H"),
+    ("travel_destinations", "H"),
+    ("word_offsets", "I"),
+    ("word_text", "B"),
+    ("word_slots", "i"),
+    ("word_codes", "i"),
+    ("word_types", "b"),
+    ("location_conditions", "b"),
+)
+
+# magic, version, array count; then per array its offset and length
+HEADER = struct.Struct("<4sHH")
+ENTRY = struct.Struct("<II")
+ALIGN = 8
+
+# Value of absent entries
+NONE = -1
+
+
+class SharedTablesError(ValueError):
+    """Raised when a segment does not hold tables this version can use"""
+
+
+class ArrayTable(Mapping):
+    """Read-only {key: int} view of an array, NONE marking absent keys"""
+
+    def __init__(self, values):
+        self.values = values
+
+    def __getitem__(self, key):
+        if type(key) is int and 0 <= key < len(self.values):
+            value = self.values[key]
+            if value != NONE:
+                return value
+        raise KeyError(key)
+
+    def __iter__(self):
+        return (key for key, value in enumerate(self.values) if value != NONE)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+
+class Exits(Mapping):
+    """Read-only {motion: destination} view of one location's exits"""
+
+    def __init__(self, motions, destinations):
+        self.motions = motions
+        self.destinations = destinations
+
+    def __getitem__(self, motion):
+        # A handful of exits per location: a scan beats a hash
+        for i, code in enumerate(self.motions):
+            if code == motion:
+                return self.destinations[i]
+        raise KeyError(motion)
+
+    def __contains__(self, motion):
+        return motion in self.motions
+
+    def __iter__(self):
+        return iter(self.motions)
+
+    def __len__(self):
+        return len(self.motions)
+
+
+class TravelTable(Mapping):
+    """Read-only {location: {motion: destination}} view of the travel arrays"""
+
+    def __init__(self, rows, motions, destinations):
+        self.rows = rows
+        self.motions = motions
+        self.destinations = destinations
+
+    def __getitem__(self, location):
+        if type(location) is int and 0 <= location < len(self.rows) - 1:
+            start, end = self.rows[location], self.rows[location + 1]
+            if start != end:
+                return Exits(self.motions[start:end], self.destinations[start:end])
+        raise KeyError(location)
+
+    def __contains__(self, location):
+        return (type(location) is int and 0 <= location < len(self.rows) - 1
+                and self.rows[location] != self.rows[location + 1])
+
+    def __iter__(self):
+        rows = self.rows
+        return (location for location in range(len(rows) - 1)
+                if rows[location] != rows[location + 1])
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+
+class Vocabulary(Mapping):
+    """Read-only {word: code or (code, type)} view of the vocabulary arrays,
+    iterating in the original order"""
+
+    def __init__(self, offsets, text, slots, codes, types):
+        self.offsets = offsets
+        self.text = text
+        self.slots = slots
+        self.codes = codes
+        self.types = types
+
+    def word(self, n):
+        return str(self.text[self.offsets[n]:self.offsets[n + 1]], "utf-8")
+
+    def find(self, word):
+        """Number of a word, or NONE if absent"""
+        if type(word) is not str:
+            return NONE
+        data = word.encode("utf-8")
+        slots, offsets, text = self.slots, self.offsets, self.text
+        mask = len(slots) - 1
+        slot = zlib.crc32(data) & mask
+        while True:
+            n = slots[slot]
+            if n == NONE or text[offsets[n]:offsets[n + 1]] == data:
+                return n
+            slot = (slot + 1) & mask
+
+    def __getitem__(self, word):
+        n = self.find(word)
+        if n == NONE:
+            raise KeyError(word)
+        if self.types[n] == NONE:
+            return self.codes[n]
+        return self.codes[n], self.types[n]
+
+    def __contains__(self, word):
+        return self.find(word) != NONE
+
+    def __iter__(self):
+        return (self.word(n) for n in range(len(self.codes)))
+
+    def __len__(self):
+        return len(self.codes)
+
+
+def encode(tables):
+    """Flatten {table name: table} for TABLES into arrays, in ARRAYS order"""
+    text, _, _ = textstore.pack(tables, TEXT_TABLES)
+
+    travel = tables["travel_table"]
+    rows = array("I")
+    motions = array("H")
+    destinations = array("H")
+    for location in range(max(travel, default=-1) + 1):
+        rows.append(len(motions))
+        for motion, destination in travel.get(location, {}).items():
+            motions.append(motion)
+            destinations.append(destination)
+    rows.append(len(motions))
+
+    vocabulary = tables["vocabulary"]
+    words = list(vocabulary)
+    slots = array("i", [NONE]) * (1 << (2 * len(words)).bit_length())  # At most half full
+    mask = len(slots) - 1
+    offsets = array("I", [0])
+    word_text = bytearray()
+    codes = array("i")
+    types = array("b")
+    for n, word in enumerate(words):
+        data = word.encode("utf-8")
+        slot = zlib.crc32(data) & mask
+        while slots[slot] != NONE:
+            slot = (slot + 1) & mask
+        slots[slot] = n
+        word_text += data
+        offsets.append(len(word_text))
+        value = vocabulary[word]
+        code, word_type = value if isinstance(value, tuple) else (value, NONE)
+        codes.append(code)
+        types.append(word_type)
+
+    conditions = tables["location_conditions"]
+    condition = array("b", [NONE]) * (max(conditions, default=-1) + 1)
+    for location, value in conditions.items():
+        condition[location] = value
+
+    return [array("B", text), rows, motions, destinations, offsets,
+            array("B", word_text), slots, codes, types, condition]
+
+
+class Segment(shared_memory.SharedMemory):
+    def close(self):
+        """Unmap the segment, unless tables are still using it (as they are
+        until exit, when the mapping goes with the process)"""
+        try:
+            super().close()
+        except BufferError:
+            pass
+
+
+def open_segment(name):
+    """Attach to a segment without taking ownership of it"""
+    try:
+        return Segment(name, track=False)  # Python 3.13+
+    except TypeError:
+        # Older versions register the segment to be unlinked when this
+        # process exits, which is for the exporting process alone to do
+        segment = Segment(name)
+        resource_tracker.unregister(segment._name, "shared_memory")
+        return segment
+
+
+class SharedTables:
+    def __init__(self, segment, owner=False):
+        """Map the tables of a segment; they are attributes named as in TABLES"""
+        self.segment = segment
+        self.owner = owner
+        data = segment.buf.toreadonly()
+
+        if len(data) < HEADER.size:
+            raise SharedTablesError("not a table segment")
+        magic, version, count = HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise SharedTablesError("not a table segment")
+        if version != VERSION or count != len(ARRAYS):
+            raise SharedTablesError(f"unsupported table segment version {version}")
+
+        views = {}
+        for i, (name, typecode) in enumerate(ARRAYS):
+            offset, length = ENTRY.unpack_from(data, HEADER.size + ENTRY.size * i)
+            size = length * array(typecode).itemsize
+            views[name] = data[offset:offset + size].cast(typecode)
+
+        for name, table in textstore.unpack(views["text"], TEXT_TABLES).items():
+            setattr(self, name, table)
+        self.travel_table = TravelTable(
+            views["travel_rows"], views["travel_motions"], views["travel_destinations"])
+        self.vocabulary = Vocabulary(
+            views["word_offsets"], views["word_text"], views["word_slots"],
+            views["word_codes"], views["word_types"])
+        self.location_conditions = ArrayTable(views["location_conditions"])
+
+    @property
+    def name(self):
+        return self.segment.name
+
+    @property
+    def size(self):
+        return self.segment.size
+
+    def unlink(self):
+        """Remove the segment, once the exporting process is done with it.
+
+        Attached processes sharing its resource tracker (those it started)
+        have unregistered the segment there, so it is registered again for
+        unlink() to unregister.
+        """
+        if self.owner:
+            resource_tracker.register(self.segment._name, "shared_memory")
+            self.segment.unlink()
+
+
+def export(tables=None):
+    """Pack tables ({table name: table}, game_data's by default) into a new
+    segment; returns its SharedTables, owned by this process"""
+    if tables is None:
+        import game_data
+        tables = {name: getattr(game_data, name) for name in TABLES}
+    arrays = encode(tables)
+
+    position = HEADER.size + ENTRY.size * len(arrays)
+    directory = []
+    for values in arrays:
+        position += -position % ALIGN
+        directory.append(ENTRY.pack(position, len(values)))
+        position += values.itemsize * len(values)
+
+    segment = Segment(create=True, size=position)
+    data = segment.buf
+    HEADER.pack_into(data, 0, MAGIC, VERSION, len(arrays))
+    data[HEADER.size:HEADER.size + ENTRY.size * len(arrays)] = b"".join(directory)
+    for values, entry in zip(arrays, directory):
+        offset, _ = ENTRY.unpack(entry)
+        data[offset:offset + values.itemsize * len(values)] = values.tobytes()
+    return SharedTables(segment, owner=True)
+
+
+def attach(name):
+    """Map the tables of the segment exported under name"""
+    return SharedTables(open_segment(name))
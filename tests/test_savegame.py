@@ -0,0 +1,91 @@
+"""Tests for the binary save format"""
+
+import os
+import struct
+import tempfile
+import unittest
+
+import savegame
+from adventure import Adventure
+
+
+def played_game():
+    game = Adventure(seed=7)
+    game.start()
+    for command in ("no", "in", "take lamp", "out", "s"):
+        game.step(command)
+    return game
+
+
+def patch_header(blob, **fields):
+    """Return blob with some header fields replaced"""
+    names = ("magic version flags location old_location dwarf_stage west_count "
+             "detail_count trouble_count pending_question rng_state "
+             "d0 d1 d2 o0 o1 o2 seen object_count abbrev_length").split()
+    values = dict(zip(names, savegame.HEADER.unpack_from(blob)))
+    values.update(fields)
+    return savegame.HEADER.pack(*(values[name] for name in names)) + blob[savegame.HEADER.size:]
+
+
+class SaveGameTest(unittest.TestCase):
+    def test_round_trip(self):
+        game = played_game()
+        copy = Adventure()
+        copy.restore(game.save())
+        self.assertEqual(copy.save(), game.save())
+        self.assertEqual(copy.step("look"), game.step("look"))
+
+    def test_corrupt_blobs_raise_save_error_and_leave_game_unchanged(self):
+        blob = played_game().save()
+        object_place = savegame.HEADER.size + 2 * 2  # Object 2, the lamp
+        corrupt = [
+            b"",
+            b"XXXX" + blob[4:],
+            blob[:-1],
+            patch_header(blob, location=400),
+            patch_header(blob, location=0),
+            patch_header(blob, old_location=65535),
+            patch_header(blob, d1=-5),
+            patch_header(blob, o2=300),
+            patch_header(blob, pending_question=7),
+            blob[:object_place] + struct.pack("<h", 500) + blob[object_place + 2:],
+            blob[:object_place] + struct.pack("<h", -2) + blob[object_place + 2:],
+        ]
+        for data in corrupt:
+            game = Adventure(seed=1)
+            game.start()
+            before = game.save()
+            with self.assertRaises(savegame.SaveError):
+                game.restore(data)
+            self.assertEqual(game.save(), before)
+            game.step("look")  # Still playable
+
+    def test_repeated_help_at_grate_still_saves(self):
+        game = Adventure(seed=7)
+        game.start()
+        for command in ("no", "s", "s", "s"):
+            game.step(command)
+        self.assertEqual(game.location, 8)
+        for _ in range(300):
+            game.step("xyzzyq")
+            if game.pending_question is not None:
+                game.step("yes")
+        copy = Adventure()
+        copy.restore(game.save())
+        self.assertEqual(copy.save(), game.save())
+
+    def test_restore_command_reports_corrupt_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "game.sav")
+            with open(path, "wb") as f:
+                f.write(patch_header(played_game().save(), location=400))
+            game = Adventure(seed=1, save_file=path)
+            game.start()
+            game.step("no")
+            text, game_over = game.step("restore")
+            self.assertIn("That isn't a game I can restore.", text)
+            self.assertFalse(game_over)
+
+
+if __name__ == "__main__":
+    unittest.main()
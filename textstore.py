@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Memory-mapped text store for Colossal Cave Adventure
+
+Packs the room descriptions and messages into one binary file of UTF-8
+blobs with an offset index per table. Identical texts (the maze rooms,
+the dead ends) are stored once. Loaded tables are read-only mappings over
+an mmap of the file, so every process using the same file shares one copy
+of the text through the page cache; lookups decode a slice of it.
+
+    python textstore.py adventure.text                      # the built-in text
+    python textstore.py adventure.text --dat adventure.dat  # its room descriptions
+    ADVENTURE_TEXT=adventure.text python server.py
+
+A multi-line entry is stored as its lines joined with newlines, which
+speak() and render_location() write in one piece.
+"""
+
+import mmap
+import struct
+import sys
+from array import array
+from collections.abc import Mapping
+
+
+MAGIC = b"CCTS"
+VERSION = 1
+
+# Tables in the store, as named in game_data and datfile
+TABLES = ("long_descriptions", "short_descriptions", "messages")
+
+# magic, version, table count; then per table its key span and index offset
+HEADER = struct.Struct("<4sHH")
+TABLE_ENTRY = struct.Struct("<II")
+
+# Start offset of a key with no text
+MISSING = 0xFFFFFFFF
+
+
+class TextStoreError(ValueError):
+    """Raised when a file is not a text store this version can load"""
+
+
+class TextTable(Mapping):
+    """Read-only {key: text} view of one table in a text store.
+
+    index holds a (start, end) pair of blob offsets for every key below
+    the span, with MISSING as the start of absent keys.
+    """
+
+    def __init__(self, data, index, span):
+        self.data = data
+        self.index = index
+        self.span = span
+
+    def __getitem__(self, key):
+        if 0 <= key < self.span:
+            start = self.index[2 * key]
+            if start != MISSING:
+                return str(self.data[start:self.index[2 * key + 1]], "utf-8")
+        raise KeyError(key)
+
+    def __contains__(self, key):
+        return (type(key) is int and 0 <= key < self.span
+                and self.index[2 * key] != MISSING)
+
+    def __iter__(self):
+        return (key for key in range(self.span) if self.index[2 * key] != MISSING)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+
+def join_text(text):
+    """A table entry (a string or a list of lines) as one string"""
+    return text if isinstance(text, str) else "\n".join(text)
+
+
+def pack(tables, names=TABLES):
+    """Encode {table name: {key: text}} for the named tables as a text
+    store image"""
+    blobs = bytearray()
+    offsets = {}  # encoded text -> offset of its stored copy
+    indexes = []
+
+    for name in names:
+        table = tables[name]
+        span = max(table, default=-1) + 1
+        index = array("I", [MISSING, MISSING]) * span
+        for key, text in table.items():
+            data = join_text(text).encode("utf-8")
+            start = offsets.get(data)
+            if start is None:
+                start = offsets[data] = len(blobs)
+                blobs += data
+            index[2 * key] = start
+            index[2 * key + 1] = start + len(data)
+        indexes.append((span, index))
+
+    # Header, table directory, indexes, then the blobs; offsets in the
+    # indexes are relative to the start of the blobs
+    position = HEADER.size + TABLE_ENTRY.size * len(names)
+    directory = []
+    for span, index in indexes:
+        directory.append(TABLE_ENTRY.pack(span, position))
+        position += index.itemsize * len(index)
+
+    image = bytearray(HEADER.pack(MAGIC, VERSION, len(names)))
+    image += b"".join(directory)
+    for _, index in indexes:
+        if sys.byteorder == "big":
+            index.byteswap()
+        image += index.tobytes()
+    image += blobs
+    return image, len(blobs), len(offsets)
+
+
+def unpack(data, names=TABLES):
+    """Return {table name: TextTable} over a text store image (a memoryview)"""
+    if len(data) < HEADER.size:
+        raise TextStoreError("not a text store")
+    magic, version, count = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise TextStoreError("not a text store")
+    if version != VERSION or count != len(names):
+        raise TextStoreError(f"unsupported text store version {version}")
+
+    entries = [TABLE_ENTRY.unpack_from(data, HEADER.size + TABLE_ENTRY.size * i)
+               for i in range(count)]
+    span, position = entries[-1]
+    blobs = data[position + 8 * span:]
+
+    tables = {}
+    for name, (span, position) in zip(names, entries):
+        index = data[position:position + 8 * span]
+        if sys.byteorder == "big":
+            index = array("I", index)
+            index.byteswap()
+        else:
+            index = index.cast("I")
+        tables[name] = TextTable(blobs, index, span)
+    return tables
+
+
+def build(tables, path):
+    """Write {table name: {key: text}} for TABLES as a text store file"""
+    image, size, unique = pack(tables)
+    with open(path, "wb") as f:
+        f.write(image)
+    return size, unique
+
+
+class TextStore:
+    def __init__(self, path):
+        """Map a text store file; its tables are attributes named as in TABLES"""
+        with open(path, "rb") as f:
+            self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        for name, table in unpack(memoryview(self.mmap)).items():
+            setattr(self, name, table)
+
+
+def main():
+    """Command line entry point"""
+    import argparse
+    parser = argparse.ArgumentParser(description="Build a memory-mapped text store")
+    parser.add_argument("output", help="text store file to write")
+    parser.add_argument("--dat", metavar="FILE",
+                        help="take the room descriptions from a .dat file "
+                             "(sections 1 and 2) instead of the built-in tables")
+    args = parser.parse_args()
+
+    import game_data
+    tables = {name: getattr(game_data, name) for name in TABLES}
+    if args.dat:
+        import datfile
+        # Only the descriptions: the .dat file numbers its messages
+        # differently, and the built-in ones are authoritative
+        dat = datfile.load(args.dat)
+        tables["long_descriptions"] = dat["long_descriptions"]
+        tables["short_descriptions"] = dat["short_descriptions"]
+
+    size, unique = build(tables, args.output)
+    entries = sum(len(tables[name]) for name in TABLES)
+    print(f"Wrote {args.output}: {entries} entries, {unique} distinct texts, "
+          f"{size} bytes of text")
+
+
+if __name__ == "__main__":
+    main()
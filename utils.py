@@ -1,33 +1,52 @@
 """
 Utility functions for Colossal Cave Adventure
 """
-import random
-import sys
+import os
 
 
-def speak(message_id, messages):
-    """Print a game message by ID"""
+class OutputBuffer:
+    """Collects a turn's output lines and flushes them with a single write
+    
+    sink is any callable taking a string, such as sys.stdout.write, a
+    socket writer or list.append. Without one, flush() just returns the text.
+    """
+    __slots__ = ('lines', 'sink')
+    
+    def __init__(self, sink=None):
+        self.lines = []
+        self.sink = sink
+    
+    def write(self, text=""):
+        """Append a line of output"""
+        self.lines.append(text)
+    
+    def flush(self):
+        """Join the pending lines, send them to the sink and return the text"""
+        if not self.lines:
+            return ""
+        text = "\n".join(self.lines) + "\n"
+        self.lines.clear()
+        
+        if self.sink is not None:
+            self.sink(text)
+        return text
+
+
+def speak(message_id, messages, write=print):
+    """Write a game message by ID"""
     if message_id in messages:
         msg = messages[message_id]
         if isinstance(msg, list):
             for line in msg:
-                print(line)
+                write(line)
         else:
-            print(msg)
-        print()
+            write(msg)
+        write()
 
 
-def get_input(prompt=""):
-    """Get input from user and parse it into words"""
-    if prompt:
-        print(prompt)
-    
-    try:
-        line = input("> ").strip().upper()
-    except EOFError:
-        print("\nGoodbye!")
-        sys.exit(0)
-    
+def split_command(line):
+    """Parse a line of player input into (word1, word2)"""
+    line = line.strip().upper()
     if not line:
         return None, None
     
@@ -42,146 +61,162 @@ def get_input(prompt=""):
         return words[0], words[1]
 
 
-def yes_no_question(question_msg, yes_msg, no_msg, messages):
-    """Ask a yes/no question and return True for yes, False for no"""
-    speak(question_msg, messages)
+class GameRandom:
+    """Per-game random number generator (SplitMix64)
     
-    while True:
-        response, _ = get_input()
-        if response in ['YES', 'Y']:
-            if yes_msg:
-                speak(yes_msg, messages)
-            return True
-        elif response in ['NO', 'N']:
-            if no_msg:
-                speak(no_msg, messages)
-            return False
-        else:
-            print("Please answer YES or NO.")
+    The whole state is one 64-bit counter, so a game's random stream is
+    cheap to store and restore, independent of other games in the same
+    process, and can be fast-forwarded with advance().
+    """
+    __slots__ = ('state',)
+    
+    GAMMA = 0x9E3779B97F4A7C15
+    MASK = 0xFFFFFFFFFFFFFFFF
+    
+    def __init__(self, seed=None):
+        if seed is None:
+            seed = int.from_bytes(os.urandom(8), "little")
+        self.state = seed & self.MASK
+    
+    def next64(self):
+        """Return the next 64-bit output"""
+        self.state = z = (self.state + self.GAMMA) & self.MASK
+        z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & self.MASK
+        z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & self.MASK
+        return z ^ (z >> 31)
+    
+    def random(self):
+        """Return a float in [0.0, 1.0)"""
+        return (self.next64() >> 11) * (1.0 / 9007199254740992.0)
+    
+    def choice(self, seq):
+        """Return a random element of a non-empty sequence"""
+        return seq[(self.next64() * len(seq)) >> 64]
+    
+    def advance(self, count):
+        """Skip the next count outputs"""
+        self.state = (self.state + count * self.GAMMA) & self.MASK
+    
+    def getstate(self):
+        return self.state
+    
+    def setstate(self, state):
+        self.state = state
 
 
-def random_chance(probability):
+def random_chance(probability, rng):
     """Return True with given probability (0.0 to 1.0)"""
-    return random.random() < probability
+    return rng.random() < probability
 
 
-def describe_location(location, long_desc, short_desc, abbrev_count, is_dark):
-    """Print location description"""
-    if is_dark:
-        return
-    
-    # Use long description if first time or abbrev_count is 0
-    if abbrev_count == 0 and location in long_desc:
-        for line in long_desc[location]:
-            print(line)
-        print()
+def render_location(location, long_desc, short_desc, long):
+    """Render a location's long or short description as one output block
+    (the text and a blank line), or "" if it has none"""
+    if long and location in long_desc:
+        text = long_desc[location]
     elif location in short_desc:
-        print(short_desc[location])
-        print()
+        text = short_desc[location]
     elif location in long_desc:
         # Fallback to long description if short description doesn't exist
-        for line in long_desc[location]:
-            print(line)
-        print()
+        text = long_desc[location]
+    else:
+        return ""
+    # A list of lines, or (from a text store) the lines already joined
+    return (text if isinstance(text, str) else "\n".join(text)) + "\n"
+
+
+# Magic words that should not be revealed by LIST (player must discover them)
+MAGIC_MOTIONS = {48, 65, 55}  # XYZZY, PLUGH, Y2
+
+
+def index_vocabulary(vocabulary):
+    """Invert the vocabulary into lookup tables.
+    
+    Returns (motion_words, object_words): the primary (shortest) word for
+    each motion code, and the list of words naming each object.
+    """
+    motion_words = {}
+    object_words = {}
+    for word, value in vocabulary.items():
+        if isinstance(value, tuple):
+            if value[1] == 1:  # Object type
+                object_words.setdefault(value[0], []).append(word)
+        elif value not in motion_words or len(word) < len(motion_words[value]):
+            motion_words[value] = word
+    return motion_words, object_words
+
+
+def render_exits(location, travel_table, motion_words):
+    """Render the movement section of LIST for a location, or None"""
+    motions = [code for code in sorted(travel_table.get(location, ()))
+               if code in motion_words and code not in MAGIC_MOTIONS]
+    if not motions:
+        return None
+    
+    lines = ["Movement:"]
+    for motion_code in motions:
+        lines.append(f"  {motion_words[motion_code].upper()}")
+    lines.append("")
+    return "\n".join(lines)
 
 
-def list_available_movements(location, travel_table, vocabulary, object_place=None):
-    """List all available commands at the current location"""
-    print("Available commands at this location:")
-    print()
+def list_available_movements(exits, object_words, objects=None, write=print):
+    """List all available commands at the current location
     
-    # Magic words that should not be revealed (player must discover them)
-    magic_codes = {48, 65, 55}  # XYZZY, PLUGH, Y2
+    exits is the location's movement section from render_exits();
+    objects, if given, are the object numbers at the location.
+    """
+    write("Available commands at this location:")
+    write()
     
     # 1. Movement commands
-    if location in travel_table:
-        available_motions = travel_table[location].keys()
-        
-        # Find words that map to these motion codes
-        movement_words = {}
-        for word, value in vocabulary.items():
-            # Only consider motion words (not tuples)
-            if not isinstance(value, tuple):
-                if value in available_motions and value not in magic_codes:
-                    if value not in movement_words:
-                        movement_words[value] = []
-                    movement_words[value].append(word)
-        
-        if movement_words:
-            print("Movement:")
-            # Sort by motion code for consistent ordering
-            for motion_code in sorted(movement_words.keys()):
-                words = movement_words[motion_code]
-                # Show the shortest/most common word for each direction
-                primary_word = min(words, key=len)
-                print(f"  {primary_word.upper()}")
-            print()
+    if exits:
+        write(exits)
     
     # 2. Objects at this location
-    if object_place:
-        objects_here = []
-        for word, value in vocabulary.items():
-            if isinstance(value, tuple) and value[1] == 1:  # Object type
-                obj_id = value[0]
-                if obj_id in object_place and object_place[obj_id] == location:
-                    objects_here.append(word)
-        
-        if objects_here:
-            print("Objects you can interact with:")
-            # Remove duplicates and sort
-            unique_objects = sorted(set(objects_here))
-            for obj in unique_objects:
-                print(f"  {obj.upper()}")
-            print()
+    objects_here = set()
+    for obj_id in objects or ():
+        objects_here.update(object_words.get(obj_id, ()))
     
-    # 3. General commands always available
-    print("General commands:")
-    print("  INVENTORY (I) - check what you're carrying")
-    print("  LOOK (L) - look around again")
-    print("  QUIT - quit the game")
-    print()
-
-
-def describe_objects(location, objects, object_place, object_props, object_desc):
-    """Describe visible objects at location"""
-    # Find all objects at this location
-    visible_objects = []
-    for obj_id, obj_loc in object_place.items():
-        if obj_loc == location and obj_id in object_desc:
-            visible_objects.append(obj_id)
-    
-    for obj_id in visible_objects:
-        # Modify description based on object state/properties
-        desc = object_desc[obj_id]
-        prop = object_props.get(obj_id, 0)
-        
-        # Special cases for certain objects
-        if obj_id == 3 and prop == 0:  # Grate locked
-            desc = "The grate is locked."
-        elif obj_id == 3 and prop == 1:  # Grate unlocked
-            desc = "The grate is unlocked."
-        
-        print(desc)
+    if objects_here:
+        write("Objects you can interact with:")
+        for obj in sorted(objects_here):
+            write(f"  {obj.upper()}")
+        write()
     
-    if visible_objects:
-        print()
+    # 3. General commands always available
+    write("General commands:")
+    write("  INVENTORY (I) - check what you're carrying")
+    write("  LOOK (L) - look around again")
+    write("  QUIT - quit the game")
+    write()
+
+
+def render_object(obj_id, prop, object_desc):
+    """Render the line describing an object in a given state, or "" if
+    the object isn't described"""
+    if obj_id not in object_desc:
+        return ""
+    # Special cases for certain objects
+    if obj_id == 3 and prop == 0:  # Grate locked
+        return "The grate is locked."
+    elif obj_id == 3 and prop == 1:  # Grate unlocked
+        return "The grate is unlocked."
+    return object_desc[obj_id]
 
 
-def list_inventory(object_place):
-    """List objects being carried"""
-    carried = []
-    for obj_id, obj_loc in object_place.items():
-        if obj_loc == -1:  # -1 means being carried
-            carried.append(obj_id)
+def list_inventory(carried, write=print):
+    """List objects being carried, given their object numbers"""
+    carried = list(carried)
     
     if not carried:
-        print("You are empty-handed.")
+        write("You are empty-handed.")
     else:
-        print("You are currently holding:")
+        write("You are currently holding:")
         for obj_id in carried:
             obj_name = get_object_name(obj_id)
-            print(f"  {obj_name}")
-    print()
+            write(f"  {obj_name}")
+    write()
 
 
 def get_object_name(obj_id):
@@ -0,0 +1,8 @@
+"""
+Version of Colossal Cave Adventure
+
+Kept apart from the engine so launchers and tools can report the version
+without importing the game.
+"""
+
+__version__ = "0.1.0-alpha"